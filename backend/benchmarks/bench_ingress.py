@@ -0,0 +1,97 @@
+# measures chat handler -> backend -> published reply latency through the old HTTP route
+# and the zmq PULL ingress that replaced it, against the real backend app
+# run from backend/: python3 benchmarks/bench_ingress.py
+import aiohttp
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+for name, value in (("DB_API", "localhost"), ("DB_API_PORT", "1337"),
+                    ("CHAT_OUT_TOPIC", "chat_output"), ("BACKEND_PORT", "18080"),
+                    ("BACKEND_ZMQ_PORT", "18081")):
+    os.environ.setdefault(name, value)
+import envelope
+import main
+import publisher
+import uvicorn
+import zmq
+
+HTTP_URL = f"http://127.0.0.1:{os.environ['BACKEND_PORT']}/chat/v1.0/"
+INGRESS_URL = f"tcp://127.0.0.1:{os.environ['BACKEND_ZMQ_PORT']}"
+OUTPUT_URL = f"tcp://127.0.0.1:{publisher.PORT}"
+
+MESSAGES = 1000
+WARMUP = 50
+
+
+def command_message() -> dict:
+    return {
+        "id": str(uuid.uuid4()), "source": "chat.handler", "specversion": "1.0",
+        "type": "chat_message", "time": "2026-01-01 00:00:00",
+        "data": {"platform": "twitch", "machine": "chat_input_handler1", "channel": "channel",
+                 "user_id": "100001", "username": "viewer", "display_name": "Viewer",
+                 "message": "!!joke", "is_command": True, "priority": 1,
+                 "response": "Why did the scarecrow win an award? He was outstanding in his field."},
+        "trace": None
+    }
+
+
+# milliseconds from sending each message until its reply is published, one at a time
+async def latencies(send, replies) -> list:
+    results = []
+    for i in range(WARMUP + MESSAGES):
+        start = time.perf_counter()
+        await send(command_message())
+        await replies.recv_multipart()
+        if i >= WARMUP:
+            results.append((time.perf_counter() - start) * 1000)
+    return results
+
+
+def summary(name:str, values:list) -> str:
+    values = sorted(values)
+    p99 = values[int(len(values) * 0.99) - 1]
+    return (f"{name}: p50 {statistics.median(values):.3f}ms, p99 {p99:.3f}ms, "
+            f"mean {statistics.mean(values):.3f}ms")
+
+
+async def run():
+    config = uvicorn.Config(main.app, host="127.0.0.1", port=int(os.environ["BACKEND_PORT"]),
+                            log_level="warning")
+    server = uvicorn.Server(config)
+    serving = asyncio.ensure_future(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    replies = publisher.CONTEXT.socket(zmq.SUB)
+    replies.setsockopt(zmq.SUBSCRIBE, publisher.OUTPUT_TOPIC.encode())
+    replies.connect(OUTPUT_URL)
+    push = publisher.CONTEXT.socket(zmq.PUSH)
+    push.connect(INGRESS_URL)
+    await asyncio.sleep(0.5)
+
+    async with aiohttp.ClientSession() as session:
+        async def post(message):
+            async with session.post(HTTP_URL, data=json.dumps(message).encode()) as r:
+                await r.read()
+
+        async def push_message(message):
+            await push.send(envelope.encode(message))
+
+        http = await latencies(post, replies)
+        ingress = await latencies(push_message, replies)
+
+    server.should_exit = True
+    await serving
+    print(summary("http /chat/v1.0/", http))
+    print(summary("zmq ingress     ", ingress))
+    print(f"p50 speedup: {statistics.median(http) / statistics.median(ingress):.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
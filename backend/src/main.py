@@ -1,9 +1,14 @@
+import asyncio
 import os
 import uuid
 import uvicorn
-import json
+import zmq
+import envelope
+import tracing
+import metrics
+import transport
 from datetime import datetime
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
 from publisher import Publisher
 
 DB_API_NAME = os.environ["DB_API"]
@@ -12,9 +17,18 @@ DATABASE = f"http://{DB_API_NAME}:{DB_API_PORT}/"
 
 ZMQ_PUB = os.environ["CHAT_OUT_TOPIC"]
 PORT = os.environ["BACKEND_PORT"]
+
+# zmq PULL address chat handlers push messages to
+INGRESS_ADDRESS = f"tcp://0.0.0.0:{os.environ['BACKEND_ZMQ_PORT']}"
+
 app = FastAPI()
 publisher = Publisher()
 
+MESSAGES = metrics.counter("backend_messages_total", "Chat messages received")
+REPLIES = metrics.counter("backend_replies_published_total", "Replies published to zmq")
+PROCESS_TIME = metrics.histogram("backend_process_seconds", "Time to process one message")
+ERRORS = metrics.counter("backend_errors_total", "Messages that failed to process")
+
 def format_message_response(message:dict, platform:str, chat_response:str) -> dict:
     output = {
         "id": str(uuid.uuid4()),
@@ -25,15 +39,18 @@ def format_message_response(message:dict, platform:str, chat_response:str) -> di
         "data": {
             "platform": platform,
             "machine": "backend1",
-            "message": chat_response
-        }
+            "channel": message["data"].get("channel"),
+            "message": chat_response,
+            "priority": message["data"].get("priority")
+        },
+        "trace": message.get("trace")
     }
-    return json.dumps(output)
+    return output
 
 
-@app.post("/chat/v1.0/")
-async def handle_message(payload:Request):
-    message = await payload.json()
+async def process_message(message:dict) -> None:
+    received = tracing.now()
+    MESSAGES.inc()
     data = message["data"]
     platform = data["platform"]
 
@@ -43,13 +60,45 @@ async def handle_message(payload:Request):
         # ignore payloads with no response
         if response:
             output = format_message_response(message, platform, response)
+            tracing.add_span(output["trace"], "backend", received)
             await publisher.publish(output)
+            REPLIES.inc()
+    PROCESS_TIME.observe((tracing.now() - received) / 1e9)
+
 
+# kept for compatibility; chat handlers now push over zmq instead
+@app.post("/chat/v1.0/")
+async def handle_message(payload:Request):
+    message = await payload.json()
+    await process_message(message)
     return {
         "status": "SUCCESS",
         "data": message
     }
 
 
+async def receive_messages() -> None:
+    socket = transport.socket(publisher.context, zmq.PULL)
+    socket.bind(INGRESS_ADDRESS)
+
+    while True:
+        msg = await socket.recv()
+        try:
+            await process_message(envelope.decode(msg))
+        except Exception as e:
+            ERRORS.inc()
+            print(e)
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.on_event("startup")
+async def startup():
+    asyncio.create_task(receive_messages())
+
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=PORT)
@@ -1,6 +1,7 @@
 import os
 import zmq
-import json
+import envelope
+import transport
 from zmq.asyncio import Context
 
 CONTEXT = Context()
@@ -14,9 +15,10 @@ class Publisher:
     def __init__(self, topic:str=OUTPUT_TOPIC, context:Context=CONTEXT):
         self.topic = topic
         self.context = context
-        self.socket = self.context.socket(zmq.PUB)
-        self.socket.bind(ZMQ_ADDRESS)
+        self.socket = transport.publisher(self.context, ZMQ_ADDRESS)
+        self.sequencer = transport.Sequencer()
 
-    async def publish(self, payload:str) -> None:
-        message = [self.topic.encode("ascii"), payload.encode("ascii")]
+    async def publish(self, payload:dict) -> None:
+        self.sequencer.stamp(payload)
+        message = [self.topic.encode("ascii"), envelope.encode(payload)]
         await self.socket.send_multipart(message)
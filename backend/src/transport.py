@@ -0,0 +1,70 @@
+import os
+import uuid
+import zmq
+import metrics
+
+# queued messages per peer before PUB drops or PUSH blocks
+SNDHWM = int(os.environ.get("ZMQ_SNDHWM", 10000))
+RCVHWM = int(os.environ.get("ZMQ_RCVHWM", 10000))
+
+# "pushpull" makes chat links block at the high-water mark instead of dropping
+MODE = os.environ.get("ZMQ_MODE", "pubsub")
+
+MISSED = metrics.counter(
+        "zmq_messages_missed_total", "Messages lost on a link, from sequence gaps", ("link",)
+        )
+
+def socket(context, kind):
+    sock = context.socket(kind)
+    sock.setsockopt(zmq.SNDHWM, SNDHWM)
+    sock.setsockopt(zmq.RCVHWM, RCVHWM)
+    return sock
+
+
+def publisher(context, address:str, mode:str=MODE):
+    sock = socket(context, zmq.PUSH if mode == "pushpull" else zmq.PUB)
+    sock.bind(address)
+    return sock
+
+
+# both socket kinds receive the same [topic, payload] frames
+def subscriber(context, address:str, topic:str, mode:str=MODE):
+    if mode == "pushpull":
+        sock = socket(context, zmq.PULL)
+    else:
+        sock = socket(context, zmq.SUB)
+        sock.setsockopt(zmq.SUBSCRIBE, bytes(topic, "ascii"))
+    sock.connect(address)
+    return sock
+
+
+# numbers outgoing messages so subscribers can count what they missed
+class Sequencer:
+    def __init__(self):
+        # a fresh source id per process, so a restart isn't mistaken for a gap
+        self.source = uuid.uuid4().hex[:8]
+        self.seq = 0
+
+    def stamp(self, payload:dict) -> None:
+        self.seq += 1
+        payload["seq"] = [self.source, self.seq]
+
+
+class GapDetector:
+    def __init__(self, link:str):
+        self.last = {}
+        self.missed = MISSED.labels(link)
+
+    # returns how many messages from this payload's source were skipped
+    def check(self, payload:dict) -> int:
+        seq = payload.get("seq")
+        if not seq:
+            return 0
+        source, number = seq
+        last = self.last.get(source)
+        self.last[source] = number
+        if last is None or number <= last + 1:
+            return 0
+        missed = number - last - 1
+        self.missed.inc(missed)
+        return missed
@@ -0,0 +1,98 @@
+# compares storing chat one POST per message, as before the write-behind buffer, with
+# ChatBuffer's batches; against a local stub by default, or a running db-api:
+# run from chat-input-handler/: python3 benchmarks/bench_chatbuffer.py [http://localhost:1337]
+import asyncio
+import os
+import sys
+import time
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+os.environ.setdefault("DB_API", "localhost")
+os.environ.setdefault("DB_API_PORT", "1337")
+from chatbuffer import ChatBuffer, FLUSH_SIZE
+from httpclient import CLIENT
+
+MESSAGES = 5000
+CONCURRENCY = 50
+
+
+def message(n:int) -> dict:
+    return {
+        "time": "2026-01-01 00:00:00",
+        "data": {"username": f"viewer{n}", "user_id": str(100000 + n),
+                 "message": f"chat line {n}", "platform": "twitch"}
+    }
+
+
+# stands in for db-api; only counts rows and requests
+class StubDatabase:
+    def __init__(self):
+        self.rows = 0
+        self.requests = 0
+
+    async def store(self, request:web.Request) -> web.Response:
+        await request.read()
+        self.rows += 1
+        self.requests += 1
+        return web.json_response({"status": "success"})
+
+    async def store_batch(self, request:web.Request) -> web.Response:
+        self.rows += len(await request.json())
+        self.requests += 1
+        return web.json_response({"status": "success"})
+
+
+async def per_message(base:str, messages:list) -> float:
+    remaining = iter(messages)
+
+    async def worker():
+        for m in remaining:
+            await CLIENT.post(f"{base}/chat/store/", m)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    return len(messages) / (time.perf_counter() - start)
+
+
+async def buffered(base:str, messages:list) -> float:
+    buffer = ChatBuffer(f"{base}/chat/store/batch/")
+    start = time.perf_counter()
+    for m in messages:
+        buffer.add(m)
+    if not await buffer.flush():
+        raise RuntimeError("batch store failed")
+    return len(messages) / (time.perf_counter() - start)
+
+
+async def main():
+    messages = [message(n) for n in range(MESSAGES)]
+    stub = runner = None
+    if len(sys.argv) > 1:
+        base = sys.argv[1].rstrip("/")
+    else:
+        stub = StubDatabase()
+        app = web.Application()
+        app.router.add_post("/chat/store/", stub.store)
+        app.router.add_post("/chat/store/batch/", stub.store_batch)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        base = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    try:
+        single = await per_message(base, messages)
+        batched = await buffered(base, messages)
+    finally:
+        await CLIENT.close()
+        if runner:
+            await runner.cleanup()
+
+    print(f"one POST per message: {single:.0f} rows/s, {MESSAGES} requests")
+    print(f"buffered batches:     {batched:.0f} rows/s, {-(-MESSAGES // FLUSH_SIZE)} requests")
+    print(f"speedup:              {batched / single:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+# compares the envelope's msgpack and json frames with the json.dumps each hop used
+# before it, for the payload every hop sends
+# run from chat-input-handler/: python3 benchmarks/bench_envelope.py
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+import envelope
+
+CAPTURE = os.path.join(os.path.dirname(__file__), "..", "tests", "data", "twitch_capture.txt")
+NUMBER = 20000
+REPEAT = 5
+
+TRACE = {"id": "4f1c2b7e-0d8a-4c55-9a59-0d3c1f0b6e21", "command": "joke",
+         "spans": [["twitch_bot.read", 1767225600000000, 1767225600000120]]}
+
+
+def hops(line:str) -> dict:
+    base = {"id": "9b2f5a3e-6c1d-4e8f-a7b0-2d4c6e8f0a1b", "specversion": "1.0",
+            "time": "2026-01-01 00:00:00", "trace": TRACE}
+    return {
+        "bot -> chat handler": dict(base, source="twitch.bot", type="chat_message",
+                                    data={"message": line, "channel": "mitchsworkshop"}),
+        "chat handler -> backend": dict(base, source="chat.handler", type="chat_message", data={
+            "platform": "twitch", "machine": "chat_input_handler1", "channel": "mitchsworkshop",
+            "user_id": "100001", "username": "viewer", "display_name": "Viewer",
+            "message": "!!joke please 🎉", "is_command": True, "response": None, "priority": 1}),
+        "backend -> output handler": dict(base, source="backend", type="chat_response", data={
+            "platform": "twitch", "channel": "mitchsworkshop", "priority": 1,
+            "message": "Why did the scarecrow win an award? He was outstanding in his field."}),
+        "output handler -> bot": dict(base, source="chat.output", type="twitch_message", data={
+            "channel": "mitchsworkshop", "priority": 1,
+            "message": "Why did the scarecrow win an award? He was outstanding in his field."}),
+    }
+
+
+# every hop before the envelope; ascii is safe here because dumps escapes non-ascii
+def legacy_round_trip(payload:dict) -> dict:
+    return json.loads(json.dumps(payload).encode("ascii"))
+
+
+def round_trip(payload:dict) -> dict:
+    return envelope.decode(envelope.encode(payload))
+
+
+# best of REPEAT runs, in microseconds per encode and decode
+def bench(function, payload:dict) -> float:
+    seconds = min(timeit.repeat(lambda: function(payload), number=NUMBER, repeat=REPEAT))
+    return seconds / NUMBER * 1e6
+
+
+def main():
+    with open(CAPTURE) as f:
+        line = next(l.rstrip("\r\n") for l in f if " PRIVMSG #" in l)
+
+    for hop, payload in hops(line).items():
+        legacy = bench(legacy_round_trip, payload)
+        envelope.FORMAT = "json"
+        as_json = bench(round_trip, payload)
+        json_size = len(envelope.encode(payload))
+        envelope.FORMAT = "msgpack"
+        as_msgpack = bench(round_trip, payload)
+        msgpack_size = len(envelope.encode(payload))
+        print(f"{hop}: json.dumps {legacy:.2f}us, envelope json {as_json:.2f}us, "
+              f"msgpack {as_msgpack:.2f}us ({legacy / as_msgpack:.1f}x); "
+              f"{json_size} -> {msgpack_size} bytes")
+
+
+if __name__ == "__main__":
+    main()
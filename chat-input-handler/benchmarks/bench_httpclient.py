@@ -0,0 +1,78 @@
+# compares a ClientSession per request, as every caller opened before httpclient, with the
+# shared pooled client, posting chat messages to a local stub db api
+# run from chat-input-handler/: python3 benchmarks/bench_httpclient.py
+import aiohttp
+import asyncio
+import json
+import os
+import sys
+import time
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+from httpclient import CLIENT
+
+MESSAGES = 2000
+
+# chat lines in flight at once, as during a raid
+CONCURRENCY = 50
+
+PAYLOAD = {
+    "time": "2026-01-01 00:00:00",
+    "data": {"username": "viewer", "user_id": "100001", "message": "hello chat", "platform": "twitch"}
+}
+
+
+async def store(request:web.Request) -> web.Response:
+    await request.read()
+    return web.json_response({"status": "success"})
+
+
+# ChatHandler.aio_post before httpclient
+async def legacy_post(url:str, payload:dict) -> dict:
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url, data=json.dumps(payload).encode()) as r:
+            return await r.json()
+
+
+async def pooled_post(url:str, payload:dict) -> dict:
+    return await CLIENT.post(url, payload)
+
+
+# messages per second with CONCURRENCY posts in flight
+async def bench(post, url:str) -> float:
+    remaining = iter(range(MESSAGES))
+
+    async def worker():
+        for _ in remaining:
+            await post(url, PAYLOAD)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    return MESSAGES / (time.perf_counter() - start)
+
+
+async def main():
+    app = web.Application()
+    app.router.add_post("/chat/store/", store)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}/chat/store/"
+
+    try:
+        legacy = await bench(legacy_post, url)
+        pooled = await bench(pooled_post, url)
+    finally:
+        await CLIENT.close()
+        await runner.cleanup()
+
+    print(f"session per request: {legacy:.0f} messages/s")
+    print(f"pooled client:       {pooled:.0f} messages/s")
+    print(f"speedup:             {pooled / legacy:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+# compares ircparser.parse with the TwitchMessage.parse it replaced, over captured chat
+# run from chat-input-handler/: python3 benchmarks/bench_ircparser.py
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+import ircparser
+
+CAPTURE = os.path.join(os.path.dirname(__file__), "..", "tests", "data", "twitch_capture.txt")
+NUMBER = 20000
+REPEAT = 5
+
+# TwitchMessage.parse before ircparser, kept only to measure against
+def legacy_parse(message:str) -> dict:
+    if "PRIVMSG" in message:
+        all_tags = message.split()[0]
+        text = message.split("PRIVMSG", maxsplit=1)[1].split(":", maxsplit=1)[-1].strip()
+        output = {"message":text}
+
+        tag_strings = all_tags.split(";") 
+        required_tags = ["user-id", "display-name", "badges", "color"]
+        for t in tag_strings:
+            k,v = t.split("=")
+            if k in required_tags:
+                if k == "badges":
+                    v = [b[0] for b in (e.split("/") for e in v.split(","))]
+                output[k] = v
+        return output
+
+
+# everything TwitchMessage reads from a line, to match what legacy_parse returned;
+# badges are only split when the user cache sees a new or changed profile
+def current_parse(line:str) -> tuple:
+    irc = ircparser.parse(line)
+    tags = irc.tags
+    return (
+        irc.text,
+        tags.get("user-id", ""),
+        tags.get("display-name", ""),
+        tags.get("badges", ""),
+        tags.get("color", "")
+    )
+
+
+# best of REPEAT runs, in microseconds per line
+def bench(parse, lines:list) -> float:
+    seconds = min(timeit.repeat(lambda: [parse(l) for l in lines], number=NUMBER, repeat=REPEAT))
+    return seconds / (NUMBER * len(lines)) * 1e6
+
+
+def main():
+    with open(CAPTURE) as f:
+        captured = [l.rstrip("\r\n") for l in f if l.strip()]
+
+    # the legacy parser only handled PRIVMSG lines
+    lines = [l for l in captured if " PRIVMSG #" in l]
+
+    legacy = bench(legacy_parse, lines)
+    current = bench(current_parse, lines)
+    print(f"legacy parse:  {legacy:.2f}us per line")
+    print(f"ircparser:     {current:.2f}us per line")
+    print(f"speedup:       {legacy / current:.1f}x")
+    print(f"all captured lines: {bench(ircparser.parse, captured):.2f}us per line")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# compares command lookups through the registry with rebuilding every command per call,
+# as Help, EditHelp and Commands did before it
+# run from chat-input-handler/: python3 benchmarks/bench_registry.py
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+for name, value in (("DB_API", "db_api"), ("DB_API_PORT", "1337"), ("ZMQ_PORT", "5555"),
+                    ("COMMANDS_TOPIC", "command_updates"), ("COMMAND_TRIGGER", "!!")):
+    os.environ.setdefault(name, value)
+import command
+from command import Command, REGISTRY, TRIGGER
+
+NUMBER = 20000
+REPEAT = 5
+
+# a name that exists, one reached through its trigger and one that doesn't exist
+NAMES = ["joke", "help", "nosuchcommand"]
+
+
+# Help.execute before the registry: every command rebuilt to look one name up
+def legacy_lookup(name:str):
+    subclasses = (s() for s in Command.__subclasses__())
+    hard_commands = {c.command_name.strip(TRIGGER): c for c in subclasses}
+    return hard_commands.get(name)
+
+
+def registry_lookup(name:str):
+    return REGISTRY.get(name)
+
+
+# Commands.execute before the registry: the hard command listing for a regular user
+def legacy_listing() -> str:
+    subclasses = (s() for s in Command.__subclasses__())
+    subclasses = (c for c in subclasses if not c.restricted)
+    return ", ".join(sorted(c.command_name for c in subclasses))
+
+
+def registry_listing() -> str:
+    return ", ".join(REGISTRY.names(False))
+
+
+# best of REPEAT runs, in microseconds per call
+def bench(function, *args) -> float:
+    seconds = min(timeit.repeat(lambda: function(*args), number=NUMBER, repeat=REPEAT))
+    return seconds / NUMBER * 1e6
+
+
+def main():
+    print(f"{len(REGISTRY.index)} names registered")
+    for name in NAMES:
+        legacy = bench(legacy_lookup, name)
+        current = bench(registry_lookup, name)
+        print(f"lookup {name!r}: legacy {legacy:.2f}us, registry {current:.3f}us, "
+              f"{legacy / current:.0f}x")
+
+    legacy = bench(legacy_listing)
+    current = bench(registry_listing)
+    print(f"listing: legacy {legacy:.2f}us, registry {current:.3f}us, {legacy / current:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
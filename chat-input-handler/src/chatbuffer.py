@@ -0,0 +1,135 @@
+import aiohttp
+import asyncio
+import metrics
+import os
+from httpclient import CLIENT
+
+DB_API = os.environ["DB_API"]
+DB_API_PORT = os.environ["DB_API_PORT"]
+BATCH_URL = f"http://{DB_API}:{DB_API_PORT}/chat/store/batch/"
+
+# flush after this many messages or this many milliseconds, whichever comes first
+FLUSH_SIZE = int(os.environ.get("CHAT_FLUSH_SIZE", 100))
+FLUSH_INTERVAL = float(os.environ.get("CHAT_FLUSH_MS", 1000)) / 1000
+
+# oldest messages are dropped past this many if the db api stays unreachable
+MAX_BUFFERED = int(os.environ.get("CHAT_MAX_BUFFERED", 50000))
+SHUTDOWN_ATTEMPTS = 5
+
+SUCCESS = {"status": "success"}
+
+# only a 4xx means the db api looked at the rows and refused them; anything else, a 5xx
+# while the database is down included, is worth sending the same rows again
+def refused(error:Exception) -> bool:
+    return isinstance(error, aiohttp.ClientResponseError) and 400 <= error.status < 500
+
+FLUSHES = metrics.counter("chat_store_flushes_total", "Chat batches sent to the db api")
+FLUSH_ERRORS = metrics.counter("chat_store_flush_errors_total", "Chat batches that failed to store")
+DROPPED = metrics.counter("chat_store_dropped_total", "Chat messages dropped from a full buffer")
+REJECTED = metrics.counter("chat_store_rejected_total", "Chat messages dropped after the db api refused them")
+
+# write-behind buffer for chat messages headed to the db api
+class ChatBuffer:
+    def __init__(self, url:str=BATCH_URL):
+        self.url = url
+        self.messages = []
+        self.dropped = 0
+        self.rejected = 0
+        self.full = asyncio.Event()
+        self.lock = asyncio.Lock()
+        self.task = None
+        self.closing = False
+
+
+    def add(self, message:dict) -> None:
+        self.messages.append(message)
+        if len(self.messages) > MAX_BUFFERED:
+            overflow = len(self.messages) - MAX_BUFFERED
+            del self.messages[:overflow]
+            self.dropped += overflow
+            DROPPED.inc(overflow)
+        if len(self.messages) >= FLUSH_SIZE:
+            self.full.set()
+
+
+    # post one batch, splitting it to find rows the db api refuses; returns the rows
+    # left unsent by any other failure
+    async def store(self, batch:list) -> list:
+        try:
+            response = await CLIENT.post(self.url, batch)
+            FLUSHES.inc()
+            if response == SUCCESS:
+                return []
+            print(f"Storing chat batch failed: {response}")
+            FLUSH_ERRORS.inc()
+            return batch
+        except Exception as e:
+            FLUSH_ERRORS.inc()
+            if not refused(e):
+                print(f"Storing chat batch failed: {e!r}")
+                return batch
+            response = e
+
+        # batches are stored in one transaction, so a single bad row fails all of them
+        if len(batch) == 1:
+            print(f"Dropping chat message the db api refused: {response}")
+            self.rejected += 1
+            REJECTED.inc()
+            return []
+        middle = len(batch) // 2
+        unsent = await self.store(batch[:middle])
+        if unsent:
+            return unsent + batch[middle:]
+        return await self.store(batch[middle:])
+
+
+    # send everything buffered, FLUSH_SIZE at a time; returns False and keeps
+    # what's unsent if it couldn't be stored
+    async def flush(self) -> bool:
+        async with self.lock:
+            while self.messages:
+                batch = self.messages[:FLUSH_SIZE]
+                del self.messages[:FLUSH_SIZE]
+
+                # a batch in flight is put back if the flush is cancelled; at worst
+                # rows already stored are sent twice, never lost
+                try:
+                    unsent = await self.store(batch)
+                except asyncio.CancelledError:
+                    self.messages = batch + self.messages
+                    raise
+
+                if unsent:
+                    # put them back in front of anything that arrived meanwhile
+                    self.messages = unsent + self.messages
+                    return False
+            return True
+
+
+    async def run(self) -> None:
+        while not self.closing:
+            try:
+                await asyncio.wait_for(self.full.wait(), FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self.full.clear()
+            await self.flush()
+
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self.run())
+
+
+    # let the background flusher finish its current flush, then make a final attempt
+    # to store what's left
+    async def close(self) -> None:
+        self.closing = True
+        if self.task:
+            self.full.set()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+        for attempt in range(SHUTDOWN_ATTEMPTS):
+            if await self.flush():
+                return
+            await asyncio.sleep(2**attempt * 0.1)
+        print(f"Lost {len(self.messages)} chat messages on shutdown")
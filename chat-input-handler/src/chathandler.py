@@ -1,37 +1,62 @@
 import asyncio
-import aiohttp
-import command
+import contentpool
+import display
+import envelope
+import metrics
 import re
 import os
+import socket
 import uuid
 import zmq
 import zmq.asyncio
 import json
+import time
+import tracing
+import transport
+from chatbuffer import ChatBuffer
 from datetime import datetime
+from commandcache import CACHE
+from httpclient import CLIENT
 from message import TwitchMessage
+from pipeline import Pipeline
 
 DB_API = os.environ["DB_API"]
 DB_API_PORT = os.environ["DB_API_PORT"]
 DATABASE = f"http://{DB_API}:{DB_API_PORT}"
 
+# zmq PUSH address of the backend's ingress
 BACKEND_NAME = os.environ["BACKEND"]
-BACKEND_PORT = os.environ["BACKEND_PORT"]
-BACKEND = f"http://{BACKEND_NAME}:{BACKEND_PORT}"
+BACKEND_ZMQ_PORT = os.environ["BACKEND_ZMQ_PORT"]
+BACKEND_ADDRESS = f"tcp://{BACKEND_NAME}:{BACKEND_ZMQ_PORT}"
 
 # zmq sub parameters
 TWITCH_BOT = os.environ["TWITCH_BOT"]
 ZMQ_PORT = os.environ["ZMQ_PORT"]
 TWITCH_ADDRESS = f"tcp://{TWITCH_BOT}:{ZMQ_PORT}"
 
-# all command objects 
-COMMANDS = (c() for c in command.Command.__subclasses__())
+# in sharded mode the bot routes each user's messages to one worker by this id
+SHARDED = os.environ.get("CHAT_SHARDING", "0") == "1"
+WORKER_ID = os.environ.get("WORKER_ID", socket.gethostname())
+WORKER_HEARTBEAT = 5
+
+# seconds between pipeline stats log lines, 0 to disable
+STATS_INTERVAL = float(os.environ.get("PIPELINE_STATS_INTERVAL", 0))
+
+# seconds to wait for queued messages to finish on shutdown
+SHUTDOWN_TIMEOUT = 10
+
+RECEIVED = metrics.counter("chat_messages_received_total", "Messages received from zmq")
+IGNORED = metrics.counter("chat_messages_ignored_total", "Non-chat IRC lines dropped")
+PROCESSED = metrics.counter("chat_messages_processed_total", "Messages sent on to the backend")
 
 class ChatHandler:
     def __init__(self):
         self.twitch = os.environ["TWITCH_IN_TOPIC"]
         self.context = zmq.asyncio.Context()
         self.twitch_address = TWITCH_ADDRESS
-        self.hard_commands = {s.command_name: s for s in COMMANDS}
+        self.pipeline = Pipeline(self.process_message)
+        self.chat_buffer = ChatBuffer()
+        self.display = display.build()
 
 
     def format_output(self, message:TwitchMessage) -> dict:
@@ -44,77 +69,126 @@ class ChatHandler:
             "data": {
                 "platform": message.platform,
                 "machine": "chat_input_handler1",
+                "channel": message.channel,
                 "user_id": message.sender.user_id,
                 "username": message.sender.username,
                 "display_name": message.sender.display_name,
                 "message": message.text,
                 "is_command": message.is_command,
-                "response": message.reply
-            }
+                "response": message.reply,
+                "priority": message.priority
+            },
+            "trace": message.trace
         }
         return output
 
 
-    # wrapper around aiohttp get logic
+    # wrapper around the shared http client
     async def aio_get(self, url:str) -> dict:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as r:
-                response = await r.json()
-                return response
+        return await CLIENT.get(url)
 
 
-    # wrapper around aiohttp post logic
+    # wrapper around the shared http client
     async def aio_post(self, url:str, payload:dict) -> None:
-        data = json.dumps(payload).encode("ascii")
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, data=data): 
-                return
+        await CLIENT.post(url, payload)
 
 
-    async def handle_chat_message(self, payload:dict) -> dict:
+    def build_message(self, payload:dict):
         payload_data = payload.get("data", "")
         platform = payload_data.get("platform", "")
         sent_time = payload.get("time", str(datetime.now()))
-        message = False
+        message = None
 
         if platform == "twitch":
-            message = TwitchMessage(sent_time, payload_data.get("message", ""))
-            await message.update_reply()
+            trace = payload.get("trace")
+            message = TwitchMessage(sent_time, payload_data.get("message", ""), trace)
 
         elif platform == "youtube":
             # youtube messages will be handled here
             pass
 
-        if message:
-            output = self.format_output(message)
-            await self.aio_post(f"{BACKEND}/chat/v1.0/", output)
-            if message.store:
-                await self.aio_post(f"{DATABASE}/chat/store/", output)
+        return message
 
 
-    async def get_command_response(self, command:str, platform:str) -> str:
-        # get list of commands from db DATABASE
-        url = f"{DATABASE}/commands/get-all/{platform}/" 
-        commands = await self.aio_get(url)
+    async def process_message(self, message:TwitchMessage) -> None:
+        start = time.monotonic()
+        reply_start = tracing.now()
+        await message.update_reply()
+        tracing.add_span(message.trace, "chat_input_handler.reply", reply_start)
+        self.pipeline.record("reply", time.monotonic() - start)
 
-        default_reply = ""
-        if command in commands:
-            output_url = f"{DATABASE}/commands/output/{platform}/{command}/"
-            response = await self.aio_get(output_url)
-            reply = response.get("output", default_reply)
-        else:
-            reply = default_reply
-        return reply
+        start = time.monotonic()
+        tracing.add_span(message.trace, "chat_input_handler", message.received)
+        output = self.format_output(message)
+        await self.backend_sock.send(envelope.encode(output))
+        PROCESSED.inc()
+        if message.store:
+            self.chat_buffer.add(output)
+        self.pipeline.record("publish", time.monotonic() - start)
+
+
+    async def close(self) -> None:
+        # finish in-flight messages, then store everything still buffered
+        await self.pipeline.drain(SHUTDOWN_TIMEOUT)
+        await self.pipeline.stop()
+        await self.chat_buffer.close()
+        await self.display.close()
+        contentpool.save()
+        await CLIENT.close()
 
 
     async def run(self) -> None:
-        # zmq SUB socket
-        self.twitch_sock = self.context.socket(zmq.SUB)
-        self.twitch_sock.connect(self.twitch_address)
-        self.twitch_sock.setsockopt(zmq.SUBSCRIBE, bytes(self.twitch, "ascii"))
+        # zmq SUB (or PULL) socket, or a DEALER that receives this worker's shard
+        if SHARDED:
+            self.twitch_sock = transport.socket(self.context, zmq.DEALER)
+            self.twitch_sock.setsockopt(zmq.IDENTITY, WORKER_ID.encode())
+            self.twitch_sock.connect(self.twitch_address)
+            asyncio.create_task(self.heartbeat())
+        else:
+            self.twitch_sock = transport.subscriber(self.context, self.twitch_address, self.twitch)
+        gaps = transport.GapDetector("twitch_chatbot")
+
+        # zmq PUSH socket to the backend
+        self.backend_sock = transport.socket(self.context, zmq.PUSH)
+        self.backend_sock.connect(BACKEND_ADDRESS)
+
+        # keep the command cache in sync with db api updates
+        asyncio.create_task(CACHE.listen(self.context))
+        await CACHE.ensure("twitch")
+        contentpool.start()
+
+        self.pipeline.start()
+        self.chat_buffer.start()
+        self.display.start()
+        asyncio.create_task(metrics.serve())
+        if STATS_INTERVAL > 0:
+            asyncio.create_task(self.log_stats())
 
         while True:
             # recieve message from twitch chat via zmq
             _, msg = await self.twitch_sock.recv_multipart()
-            payload = json.loads(msg)
-            await self.handle_chat_message(payload)
+            RECEIVED.inc()
+            payload = envelope.decode(msg)
+            gaps.check(payload)
+            message = self.build_message(payload)
+
+            # only chat lines are answered and stored; other IRC commands are dropped
+            # messages from one user are handled in order, others run concurrently
+            if message and message.is_chat:
+                self.display.add(message)
+                await self.pipeline.submit(message.sender.user_id, message)
+            else:
+                IGNORED.inc()
+
+
+    # lets the bot know this worker is alive and should be given a shard
+    async def heartbeat(self) -> None:
+        while True:
+            await self.twitch_sock.send_multipart([b"ready"])
+            await asyncio.sleep(WORKER_HEARTBEAT)
+
+
+    async def log_stats(self) -> None:
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            print(json.dumps(self.pipeline.stats()))
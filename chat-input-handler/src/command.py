@@ -1,7 +1,13 @@
-import aiohttp
+import asyncio
+import metrics
 import os
-import json
+import random
+import time
 from abc import ABC, abstractmethod
+from commandcache import CACHE
+from contentpool import ContentPool
+from registry import CommandRegistry, load_plugins, strip_trigger
+from httpclient import CLIENT
 from user import TwitchUser
 
 MAX_MESSAGE_LENGTH = 500
@@ -12,6 +18,66 @@ TRIGGER = os.environ["COMMAND_TRIGGER"]
 
 DEFAULT_HELP = "There's no help entry for that command. Sorry!"
 
+# seconds a command may run before it's cancelled
+DEFAULT_TIMEOUT = float(os.environ.get("COMMAND_TIMEOUT", 5))
+
+# failures in a row that open a command's circuit, and seconds before it's retried
+BREAKER_THRESHOLD = int(os.environ.get("COMMAND_BREAKER_THRESHOLD", 5))
+BREAKER_RESET = float(os.environ.get("COMMAND_BREAKER_RESET", 30))
+
+TIMEOUT_REPLY = "That took too long. Try again in a bit!"
+ERROR_REPLY = "Something went wrong with that command. Sorry!"
+UNAVAILABLE_REPLY = "That command is taking a break. Try again later!"
+
+# hard commands are labelled by name without the trigger; text commands share one
+# "text" label to bound cardinality
+COMMAND_TIME = metrics.histogram(
+        "chat_command_seconds", "Command execution time", ("command",)
+        )
+COMMAND_FAILURES = metrics.counter(
+        "chat_command_failures_total", "Command timeouts, errors and rejections", ("command", "reason")
+        )
+
+class CircuitBreaker:
+    def __init__(self, threshold:int=BREAKER_THRESHOLD, reset_after:float=BREAKER_RESET,
+                 clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+
+        # set while one call tests whether an open circuit can close
+        self.probing = False
+
+    # once the reset time has passed a single call is let through as a probe; its success
+    # closes the circuit, its failure reopens it. A probe that never reports back is
+    # followed by another after the reset time
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        now = self.clock()
+        if now - self.opened_at < self.reset_after:
+            return False
+        self.probing = True
+        self.opened_at = now
+        return True
+
+    def success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def failure(self) -> None:
+        self.failures += 1
+        if self.probing or self.failures >= self.threshold:
+            self.opened_at = self.clock()
+        self.probing = False
+
+
+# one breaker per command name
+BREAKERS = {}
+
 class Command(ABC):
     @property
     @abstractmethod
@@ -27,24 +93,61 @@ class Command(ABC):
     def store(self) -> bool:
         return True
 
+    # other names the command answers to, with or without the trigger
+    @property
+    def aliases(self) -> tuple:
+        return ()
+
     @property
     def help(self) -> str:
         return DEFAULT_HELP
 
+    @property
+    def timeout(self) -> float:
+        return DEFAULT_TIMEOUT
+
+    @property
+    def breaker(self) -> CircuitBreaker:
+        breaker = BREAKERS.get(self.command_name)
+        if breaker is None:
+            breaker = BREAKERS[self.command_name] = CircuitBreaker()
+        return breaker
+
     @abstractmethod
     async def execute(self, user=TwitchUser(), message=""):
         raise NotImplementedError
 
-    async def aio_get(self, url:str, headers={}) -> dict:
-        async with aiohttp.ClientSession(headers=headers) as session:
-            async with session.get(url) as r:
-                response = await r.json()
-                return response
+    # execute within the command's time budget, failing fast while its circuit is open
+    async def run(self, user=TwitchUser(), message=""):
+        name = strip_trigger(self.command_name)
+        breaker = self.breaker
+        if not breaker.allow():
+            COMMAND_FAILURES.labels(name, "open").inc()
+            return UNAVAILABLE_REPLY
+
+        start = time.monotonic()
+        try:
+            reply = await asyncio.wait_for(self.execute(user, message), self.timeout)
+        except asyncio.TimeoutError:
+            breaker.failure()
+            COMMAND_FAILURES.labels(name, "timeout").inc()
+            return TIMEOUT_REPLY
+        except Exception as e:
+            print(f"{name} failed: {e}")
+            breaker.failure()
+            COMMAND_FAILURES.labels(name, "error").inc()
+            return ERROR_REPLY
+        finally:
+            COMMAND_TIME.labels(name).observe(time.monotonic() - start)
+
+        breaker.success()
+        return reply
+
+    async def aio_get(self, url:str, headers:dict=None) -> dict:
+        return await CLIENT.get(url, headers)
 
     async def aio_post(self, url:str, payload:dict) -> None:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, data=json.dumps(payload).encode()) as r:
-                return
+        await CLIENT.post(url, payload)
 
 
 class AddCommand(Command):
@@ -59,9 +162,7 @@ class AddCommand(Command):
     async def execute(self, user:TwitchUser, message:str):
         if len(message.split()) <= 1:
             return
-        command = message.split()[1]
-        if command.startswith(TRIGGER):
-           command = command.lstrip(TRIGGER)
+        command = strip_trigger(message.split()[1])
         output = message.split(maxsplit=2)[-1]
 
         # add entry to text_command table
@@ -82,7 +183,7 @@ class EditCommand(Command):
     async def execute(self, user=TwitchUser(), message=""):
         if len(message.split()) <= 1:
             return
-        name = message.split()[1].lstrip(TRIGGER)
+        name = strip_trigger(message.split()[1])
         new_output = message.split(maxsplit=2)[-1]
         url = f"{DATABASE}/commands/edit/twitch/"
         payload = {
@@ -105,9 +206,7 @@ class DelCommand(Command):
     async def execute(self, user=TwitchUser(), message=""):
         if len(message.split()) <= 1:
             return
-        command = message.split()[1]
-        if command.startswith(TRIGGER):
-            command = command.lstrip(TRIGGER)
+        command = strip_trigger(message.split()[1])
 
         # remove text command from database
         payload = {"name": command}
@@ -149,27 +248,23 @@ class Help(Command):
         return output.replace("\n", "")
 
     async def execute(self, user=TwitchUser(), message=""):
-        subclasses = (s() for s in Command.__subclasses__())
-        hard_commands = {c.command_name.strip(TRIGGER): c for c in subclasses}
-        text_commands = await self.aio_get(f"{DATABASE}/commands/get-all/twitch/")
         response = f"That's not a command, {user.display_name}!"
 
         if len(message.split()) <= 1:
             response = f"""
             The {self.command_name} command requires a second command name as an
-            argument. Type \"{self.command_name} {self.command_name.strip(TRIGGER)}\"
+            argument. Type \"{self.command_name} {strip_trigger(self.command_name)}\"
             for more information.
             """
             return response.replace("\n", "")
-        command = message.split()[1].strip(TRIGGER)
-        if command in hard_commands:
-            command_used = hard_commands[command]
-            response = command_used.help
+        command = strip_trigger(message.split()[1])
+        if command in REGISTRY:
+            response = REGISTRY.help[command]
 
-        elif command in text_commands:
-            help_url = f"{DATABASE}/commands/help/twitch/{command}/"
-            api_response = await self.aio_get(help_url)
-            response = api_response.get("output", response)
+        else:
+            text_command = await CACHE.get("twitch", command)
+            if text_command:
+                response = text_command["help_output"]
 
         return response
 
@@ -190,13 +285,8 @@ class EditHelp(Command):
     async def execute(self, user=TwitchUser(), message=""):
         if len(message.split()) <= 1:
             return
-        url = f"{DATABASE}/commands/get-all/twitch/"
-        subclasses = (s() for s in Command.__subclasses__())
-        
-        text_commands = await self.aio_get(url)
-        hard_commands = [c.command_name.strip(TRIGGER) for c in subclasses]
-
-        command = message.split()[1].strip(TRIGGER)
+        text_commands = await CACHE.ensure("twitch")
+        command = strip_trigger(message.split()[1])
         new_output = message.split(maxsplit=2)[-1]
         response = f"{command} command help entry edited, {user.display_name}!"
 
@@ -204,7 +294,7 @@ class EditHelp(Command):
             edit_url = f"{DATABASE}/commands/help/edit/twitch/{command}/"
             payload = {"help_output": new_output}
             await self.aio_post(edit_url, payload)
-        elif command in hard_commands:
+        elif command in REGISTRY:
             response = f"The {command} command help entry can't be changed with this command."
         else:
             response = f"{command} is not a command. Sorry!"
@@ -216,18 +306,25 @@ class Commands(Command):
     def command_name(self) -> str:
         return f"{TRIGGER}commands"
 
+    def __init__(self):
+        # privilege -> (text commands the listing was built from, listing)
+        self.listings = {}
+
     async def execute(self, user=TwitchUser(), message=""):
         # only include restricted commands if user is a mod or broadcaster
-        subclasses = (s() for s in Command.__subclasses__())
+        privileged = user.is_mod or user.is_broadcaster
+        text_commands = await CACHE.ensure("twitch")
 
-        if not (user.is_mod or user.is_broadcaster):
-            subclasses = (c for c in subclasses if not c.restricted)
+        # the cache swaps in a new dict on reload, so the listing is rebuilt only then
+        cached = self.listings.get(privileged)
+        if cached is not None and cached[0] is text_commands:
+            return cached[1]
 
-        hard_commands = [c.command_name for c in subclasses]
-        url = f"{DATABASE}/commands/get-all/twitch/"
-        text_commands = await self.aio_get(url)
-        all_commands = hard_commands + [f"{TRIGGER}{c}" for c in text_commands]
-        return ", ".join(sorted(all_commands))
+        all_commands = list(REGISTRY.names(privileged))
+        all_commands += [f"{TRIGGER}{c}" for c in text_commands]
+        listing = ", ".join(sorted(all_commands))
+        self.listings[privileged] = (text_commands, listing)
+        return listing
 
 
 class Joke(Command):
@@ -236,18 +333,8 @@ class Joke(Command):
         return f"{TRIGGER}joke"
 
     async def execute(self, user=TwitchUser(), message=""):
-        error_message = "I couldn't find a short enough joke. Sorry!"
-        url = "https://icanhazdadjoke.com/"
-        headers = {"accept": "application/json"}
-        num_attempts = 10
-
-        # try to get a short enough joke to fit in chat
-        for _ in range(num_attempts):
-            result = await self.aio_get(url, headers)
-            joke = result["joke"]
-            if len(joke) <= MAX_MESSAGE_LENGTH:
-                return joke
-        return error_message
+        error_message = "I'm all out of jokes right now. Try again in a bit!"
+        return JOKES.take() or error_message
 
 
 class Poem(Command):
@@ -256,22 +343,32 @@ class Poem(Command):
         return f"{TRIGGER}poem"
 
     async def execute(self, user=TwitchUser(), message=""):
-        num_lines = 4
-        num_attempts = 5
-        url = f"https://poetrydb.org/linecount/{num_lines}/lines"
-        error_message = "I couldn't find a short enough poem. Sorry!"
-        poems = await self.aio_get(url)
-
-        for i,_ in enumerate(poems):
-            # stop parsing poem list after number of attempts
-            if i >= num_attempts:
-                break
-
-            lines = poems[i]["lines"]
-            poem = "; ".join(lines)
-            if len(poem) > MAX_MESSAGE_LENGTH:
-                continue
-            return poem
-
-        # on failure to find a poem, return error_message
-        return error_message
+        error_message = "I'm all out of poems right now. Try again in a bit!"
+        return POEMS.take() or error_message
+
+
+async def fetch_jokes() -> list:
+    url = "https://icanhazdadjoke.com/"
+    headers = {"accept": "application/json"}
+    result = await CLIENT.get(url, headers)
+    return [result["joke"]]
+
+
+async def fetch_poems() -> list:
+    num_lines = 4
+    url = f"https://poetrydb.org/linecount/{num_lines}/lines"
+    poems = await CLIENT.get(url)
+
+    # the whole corpus comes back at once, so take a different slice each refill
+    random.shuffle(poems)
+    return ["; ".join(p["lines"]) for p in poems]
+
+
+# jokes and poems are fetched ahead of time so replies never wait on the network
+JOKES = ContentPool("jokes", fetch_jokes, MAX_MESSAGE_LENGTH)
+POEMS = ContentPool("poems", fetch_poems, MAX_MESSAGE_LENGTH)
+
+
+# every command, built once: the ones above first, then any installed plugins
+BUILTINS = Command.__subclasses__()
+REGISTRY = CommandRegistry([c() for c in BUILTINS + load_plugins()])
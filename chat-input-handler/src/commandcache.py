@@ -0,0 +1,124 @@
+import asyncio
+import envelope
+import os
+import time
+import transport
+import zmq
+import zmq.asyncio
+from httpclient import CLIENT
+
+DB_API = os.environ["DB_API"]
+DB_API_PORT = os.environ["DB_API_PORT"]
+DATABASE = f"http://{DB_API}:{DB_API_PORT}"
+
+# zmq SUB address for command update events from the db api
+ZMQ_PORT = os.environ["ZMQ_PORT"]
+UPDATES_ADDRESS = f"tcp://{DB_API}:{ZMQ_PORT}"
+COMMANDS_TOPIC = os.environ["COMMANDS_TOPIC"]
+
+# fallback reload interval in case an update event is ever missed
+CACHE_TTL = float(os.environ.get("COMMAND_CACHE_TTL", 300))
+
+# seconds before retrying a failed load, doubling with each failure in a row up to the ttl
+RETRY_DELAY = float(os.environ.get("COMMAND_CACHE_RETRY", 1))
+
+class TextCommandCache:
+    def __init__(self):
+        # platform -> {command name -> {"output":..., "help_output":...}}
+        self.platforms = {}
+
+        # invalidation version per platform, and the version currently loaded
+        self.versions = {}
+        self.loaded = {}
+        self.loaded_at = {}
+        self.locks = {}
+
+        # failed loads in a row per platform, and when the next attempt is due
+        self.failures = {}
+        self.retry_at = {}
+
+
+    def is_fresh(self, platform:str) -> bool:
+        if platform not in self.loaded:
+            return False
+        if self.loaded[platform] != self.versions.get(platform, 0):
+            return False
+        return time.monotonic() - self.loaded_at[platform] < CACHE_TTL
+
+
+    # while the db api is failing the last loaded commands keep being served
+    def failed(self, platform:str, error) -> None:
+        failures = self.failures[platform] = self.failures.get(platform, 0) + 1
+        delay = min(RETRY_DELAY * 2**(failures - 1), CACHE_TTL)
+        self.retry_at[platform] = time.monotonic() + delay
+        print(f"Could not load {platform} commands, retrying in {delay:g}s: {error}")
+
+
+    async def load(self, platform:str) -> None:
+        lock = self.locks.setdefault(platform, asyncio.Lock())
+        async with lock:
+            # another caller may have reloaded, or failed to, while we waited on the lock
+            if self.is_fresh(platform) or time.monotonic() < self.retry_at.get(platform, 0):
+                return
+
+            version = self.versions.get(platform, 0)
+            try:
+                entries = await CLIENT.get(f"{DATABASE}/commands/dump/{platform}/")
+                if not isinstance(entries, list):
+                    raise ValueError(entries)
+                commands = {
+                    e["command"]: {"output": e["output"], "help_output": e["help_output"]}
+                    for e in entries
+                }
+            except Exception as e:
+                self.failed(platform, repr(e))
+                return
+
+            self.platforms[platform] = commands
+            self.loaded[platform] = version
+            self.loaded_at[platform] = time.monotonic()
+            self.failures.pop(platform, None)
+            self.retry_at.pop(platform, None)
+
+
+    async def ensure(self, platform:str) -> dict:
+        if not self.is_fresh(platform):
+            await self.load(platform)
+        return self.platforms.get(platform, {})
+
+
+    async def get(self, platform:str, command:str) -> dict:
+        commands = await self.ensure(platform)
+        return commands.get(command)
+
+
+    def invalidate(self, platform:str) -> None:
+        platforms = list(self.platforms) if platform == "all" else [platform]
+        for p in platforms:
+            self.versions[p] = self.versions.get(p, 0) + 1
+
+            # an update event means the db api is back, so don't wait out a backoff
+            self.retry_at.pop(p, None)
+
+            # refresh in the background so the next lookup is already warm
+            asyncio.create_task(self.load(p))
+
+
+    # apply command update events published by the db api
+    async def listen(self, context:zmq.asyncio.Context) -> None:
+        socket = transport.subscriber(context, UPDATES_ADDRESS, COMMANDS_TOPIC, mode="pubsub")
+        gaps = transport.GapDetector("db_api")
+
+        while True:
+            _, msg = await socket.recv_multipart()
+            event = envelope.decode(msg)
+
+            # after a missed update nothing can be trusted, so reload everything
+            if gaps.check(event):
+                self.invalidate("all")
+            else:
+                self.invalidate(event["data"]["platform"])
+
+
+# one cache shared by every caller in this service
+CACHE = TextCommandCache()
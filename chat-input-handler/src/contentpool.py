@@ -0,0 +1,150 @@
+import asyncio
+import json
+import metrics
+import os
+import tempfile
+from collections import deque
+
+# items kept ready per pool, and the level that triggers a background refill
+POOL_SIZE = int(os.environ.get("CONTENT_POOL_SIZE", 50))
+POOL_LOW_WATERMARK = int(os.environ.get("CONTENT_POOL_LOW_WATERMARK", 10))
+
+# served items that won't be handed out again until this many others have been
+POOL_RECENT = int(os.environ.get("CONTENT_POOL_RECENT", 200))
+
+# snapshots let a restarted handler serve immediately instead of starting empty
+POOL_DIR = os.environ.get("CONTENT_POOL_DIR", "pools")
+
+# fetches in a row that add nothing before a refill gives up until the next one
+MAX_STALE_FETCHES = 5
+
+SERVED = metrics.counter("content_pool_served_total", "Items served from content pools", ("pool",))
+EMPTY = metrics.counter("content_pool_empty_total", "Requests that found a content pool empty", ("pool",))
+FETCH_ERRORS = metrics.counter("content_pool_fetch_errors_total", "Failed content pool fetches", ("pool",))
+SIZE = metrics.gauge("content_pool_size", "Items ready in a content pool", ("pool",))
+
+# every pool in this service, by name
+POOLS = {}
+
+class ContentPool:
+    def __init__(self, name:str, fetch, max_length:int, size:int=POOL_SIZE,
+                 low_watermark:int=POOL_LOW_WATERMARK, recent:int=POOL_RECENT):
+        # fetch is a coroutine function returning a list of candidate strings
+        self.name = name
+        self.fetch = fetch
+        self.max_length = max_length
+        self.size = size
+        self.low_watermark = low_watermark
+        self.path = os.path.join(POOL_DIR, f"{name}.json")
+
+        self.items = deque()
+        self.queued = set()
+        self.recent = deque(maxlen=recent)
+        self.recent_set = set()
+        self.refilling = None
+
+        self.served = SERVED.labels(name)
+        self.empty = EMPTY.labels(name)
+        self.fetch_errors = FETCH_ERRORS.labels(name)
+        SIZE.labels(name).function = lambda: len(self.items)
+        POOLS[name] = self
+
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+    # queue an item unless it's too long for chat, already queued or recently served
+    def add(self, item:str) -> bool:
+        if len(item) > self.max_length or item in self.queued or item in self.recent_set:
+            return False
+        self.items.append(item)
+        self.queued.add(item)
+        return True
+
+
+    # never touches the network; a low pool is topped up in the background
+    def take(self) -> str:
+        if len(self.items) <= self.low_watermark:
+            self.refill_soon()
+        if not self.items:
+            self.empty.inc()
+            return None
+
+        item = self.items.popleft()
+        self.queued.discard(item)
+        if len(self.recent) == self.recent.maxlen:
+            self.recent_set.discard(self.recent[0])
+        self.recent.append(item)
+        self.recent_set.add(item)
+        self.served.inc()
+        return item
+
+
+    def refill_soon(self) -> None:
+        if self.refilling is None or self.refilling.done():
+            self.refilling = asyncio.create_task(self.refill())
+
+
+    async def refill(self) -> None:
+        stale = 0
+        while len(self.items) < self.size and stale < MAX_STALE_FETCHES:
+            try:
+                candidates = await self.fetch()
+            except Exception as e:
+                print(f"Could not refill {self.name}: {e}")
+                self.fetch_errors.inc()
+                stale += 1
+                continue
+
+            added = 0
+            for item in candidates:
+                if len(self.items) >= self.size:
+                    break
+                added += self.add(item)
+            stale = 0 if added else stale + 1
+        self.save()
+
+
+    def load(self) -> None:
+        try:
+            with open(self.path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return
+        for item in snapshot.get("items", []):
+            self.add(item)
+        for item in snapshot.get("recent", [])[-self.recent.maxlen:]:
+            self.recent.append(item)
+            self.recent_set.add(item)
+
+
+    # replicas can share POOL_DIR, so each writes its own temporary file next to the
+    # snapshot before swapping it in
+    def save(self) -> None:
+        snapshot = {"items": list(self.items), "recent": list(self.recent)}
+        directory = os.path.dirname(self.path)
+        tmp_path = None
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", dir=directory, prefix=f"{self.name}.",
+                                             suffix=".tmp", delete=False) as f:
+                tmp_path = f.name
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not save {self.name} snapshot: {e}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+# warm every pool from its snapshot and top it up
+def start() -> None:
+    for pool in POOLS.values():
+        pool.load()
+        pool.refill_soon()
+
+
+def save() -> None:
+    for pool in POOLS.values():
+        pool.save()
@@ -0,0 +1,105 @@
+import metrics
+import os
+import time
+from collections import OrderedDict
+
+# commands allowed per window: for each user, for each command and across all of chat
+USER_LIMIT = int(os.environ.get("COOLDOWN_USER_LIMIT", 3))
+USER_WINDOW = float(os.environ.get("COOLDOWN_USER_WINDOW", 15))
+COMMAND_LIMIT = int(os.environ.get("COOLDOWN_COMMAND_LIMIT", 10))
+COMMAND_WINDOW = float(os.environ.get("COOLDOWN_COMMAND_WINDOW", 30))
+GLOBAL_LIMIT = int(os.environ.get("COOLDOWN_GLOBAL_LIMIT", 20))
+GLOBAL_WINDOW = float(os.environ.get("COOLDOWN_GLOBAL_WINDOW", 30))
+
+# tracked keys per limiter; the least recently used are forgotten first
+MAX_KEYS = int(os.environ.get("COOLDOWN_MAX_KEYS", 10000))
+
+THROTTLED = metrics.counter(
+        "chat_commands_throttled_total", "Commands dropped by a cooldown", ("scope",)
+        )
+
+class SlidingWindow:
+    # a count for the current fixed window and the one before it
+    __slots__ = ("start", "current", "previous")
+
+    def __init__(self, start:float):
+        self.start = start
+        self.current = 0
+        self.previous = 0
+
+
+class SlidingWindowLimiter:
+    def __init__(self, limit:int, window:float, max_keys:int=MAX_KEYS):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self.keys = OrderedDict()
+
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+    def lookup(self, key:str, now:float) -> SlidingWindow:
+        counter = self.keys.get(key)
+        if counter is None:
+            counter = self.keys[key] = SlidingWindow(now)
+            if len(self.keys) > self.max_keys:
+                self.keys.popitem(last=False)
+            return counter
+
+        self.keys.move_to_end(key)
+        elapsed = now - counter.start
+        if elapsed >= self.window:
+            # a key idle for two windows has nothing left to carry over
+            counter.previous = counter.current if elapsed < 2 * self.window else 0
+            counter.current = 0
+            counter.start = now - elapsed % self.window
+        return counter
+
+
+    # weights the previous window by how much of it still overlaps the sliding one
+    def estimate(self, counter:SlidingWindow, now:float) -> float:
+        overlap = 1 - (now - counter.start) / self.window
+        return counter.previous * overlap + counter.current
+
+
+    def available(self, key:str, now:float) -> bool:
+        counter = self.lookup(key, now)
+        return self.estimate(counter, now) < self.limit
+
+
+    def hit(self, key:str, now:float) -> None:
+        self.lookup(key, now).current += 1
+
+
+class Cooldowns:
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.user = SlidingWindowLimiter(USER_LIMIT, USER_WINDOW)
+        self.command = SlidingWindowLimiter(COMMAND_LIMIT, COMMAND_WINDOW)
+        self.all = SlidingWindowLimiter(GLOBAL_LIMIT, GLOBAL_WINDOW)
+        self.throttled = {scope: THROTTLED.labels(scope) for scope in ("user", "command", "global")}
+
+
+    # a command only counts against the limits when every one of them lets it through
+    def allow(self, user_id:str, command:str) -> bool:
+        now = self.clock()
+        if not self.user.available(user_id, now):
+            self.throttled["user"].inc()
+            return False
+        if not self.command.available(command, now):
+            self.throttled["command"].inc()
+            return False
+        if not self.all.available("", now):
+            self.throttled["global"].inc()
+            return False
+
+        self.user.hit(user_id, now)
+        self.command.hit(command, now)
+        self.all.hit("", now)
+        return True
+
+
+# one set of cooldowns shared by every message in this service
+COOLDOWNS = Cooldowns()
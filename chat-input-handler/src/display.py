@@ -0,0 +1,130 @@
+import abc
+import asyncio
+import json
+import metrics
+import os
+import sys
+from collections import deque
+
+# off, console (coloured terminal output) or log (json lines in DISPLAY_FILE)
+DISPLAY_MODE = os.environ.get("CHAT_DISPLAY", "console")
+DISPLAY_FILE = os.environ.get("CHAT_DISPLAY_FILE", "chat.log")
+
+# lines written per interval, and how many may wait before new ones are dropped
+DISPLAY_INTERVAL = float(os.environ.get("CHAT_DISPLAY_MS", 100)) / 1000
+MAX_BUFFERED = int(os.environ.get("CHAT_DISPLAY_BUFFER", 1000))
+
+DISPLAYED = metrics.counter("chat_display_lines_total", "Chat lines rendered")
+DROPPED = metrics.counter("chat_display_dropped_total", "Chat lines dropped from a full display buffer")
+
+class NullDisplay:
+    def add(self, message) -> None:
+        pass
+
+    def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+# renders chat in batches off the processing path; a slow output drops lines, never messages
+class BufferedDisplay(NullDisplay, abc.ABC):
+    def __init__(self, max_buffered:int=MAX_BUFFERED):
+        self.lines = deque()
+        self.max_buffered = max_buffered
+        self.task = None
+
+
+    def add(self, message) -> None:
+        if len(self.lines) >= self.max_buffered:
+            DROPPED.inc()
+            return
+        self.lines.append((message.sent_time, message.sender, message.text))
+
+
+    @abc.abstractmethod
+    def render(self, sent_time:str, sender, text:str) -> str:
+        raise NotImplementedError
+
+
+    # blocking; runs in the default executor
+    @abc.abstractmethod
+    def write(self, output:str) -> None:
+        raise NotImplementedError
+
+
+    def render_and_write(self, lines:list) -> None:
+        self.write("".join(self.render(*line) for line in lines))
+
+
+    # rendering and writing both happen in the default executor, off the event loop
+    async def flush(self) -> None:
+        if not self.lines:
+            return
+        batch = list(self.lines)
+        self.lines.clear()
+        await asyncio.get_running_loop().run_in_executor(None, self.render_and_write, batch)
+        DISPLAYED.inc(len(batch))
+
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(DISPLAY_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Display failed: {e}")
+
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self.run())
+
+
+    async def close(self) -> None:
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        await self.flush()
+
+
+class ConsoleDisplay(BufferedDisplay):
+    def render(self, sent_time:str, sender, text:str) -> str:
+        r,g,b = sender.color
+        return f"\033[38;2;{r};{g};{b}m{sender.display_name}\033[38;2;255;255;255m {text}\n\n"
+
+
+    def write(self, output:str) -> None:
+        sys.stdout.write(output)
+        sys.stdout.flush()
+
+
+class LogDisplay(BufferedDisplay):
+    def __init__(self, path:str=DISPLAY_FILE, max_buffered:int=MAX_BUFFERED):
+        super().__init__(max_buffered)
+        self.path = path
+
+
+    def render(self, sent_time:str, sender, text:str) -> str:
+        line = {
+            "time": sent_time,
+            "user_id": sender.user_id,
+            "display_name": sender.display_name,
+            "message": text
+        }
+        return json.dumps(line) + "\n"
+
+
+    def write(self, output:str) -> None:
+        with open(self.path, "a") as f:
+            f.write(output)
+
+
+def build(mode:str=DISPLAY_MODE) -> NullDisplay:
+    if mode == "console":
+        return ConsoleDisplay()
+    if mode == "log":
+        return LogDisplay()
+    if mode != "off":
+        print(f"Unknown CHAT_DISPLAY mode {mode}, display is off")
+    return NullDisplay()
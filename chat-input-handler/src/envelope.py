@@ -0,0 +1,25 @@
+import json
+import os
+import msgpack
+
+# binary frames start with this version byte; json frames always start with "{"
+BINARY_VERSION = 1
+JSON_START = ord("{")
+
+# format used when sending; every service reads both, so switch to msgpack only
+# once none still running can read json alone
+FORMAT = os.environ.get("ENVELOPE_FORMAT", "json")
+
+def encode(payload:dict) -> bytes:
+    if FORMAT == "json":
+        return json.dumps(payload).encode()
+    return bytes((BINARY_VERSION,)) + msgpack.packb(payload, use_bin_type=True)
+
+
+def decode(frame:bytes) -> dict:
+    version = frame[0]
+    if version == BINARY_VERSION:
+        return msgpack.unpackb(memoryview(frame)[1:], raw=False)
+    if version == JSON_START:
+        return json.loads(frame)
+    raise ValueError(f"Unknown envelope version: {version}")
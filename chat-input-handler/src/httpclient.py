@@ -0,0 +1,54 @@
+import aiohttp
+import os
+import json
+
+# connection pool parameters
+POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 100))
+POOL_SIZE_PER_HOST = int(os.environ.get("HTTP_POOL_SIZE_PER_HOST", 20))
+KEEPALIVE_TIMEOUT = float(os.environ.get("HTTP_KEEPALIVE_TIMEOUT", 30))
+DNS_CACHE_TTL = int(os.environ.get("HTTP_DNS_CACHE_TTL", 300))
+
+# request timeouts in seconds
+TOTAL_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", 10))
+CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 2))
+
+class HttpClient:
+    def __init__(self):
+        self.session = None
+
+
+    # sessions must be created inside a running event loop, so build it lazily
+    def get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=POOL_SIZE,
+                limit_per_host=POOL_SIZE_PER_HOST,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=DNS_CACHE_TTL
+            )
+            timeout = aiohttp.ClientTimeout(total=TOTAL_TIMEOUT, sock_connect=CONNECT_TIMEOUT)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self.session
+
+
+    async def get(self, url:str, headers:dict=None) -> dict:
+        async with self.get_session().get(url, headers=headers) as r:
+            response = await r.json()
+            return response
+
+
+    async def post(self, url:str, payload) -> dict:
+        data = json.dumps(payload).encode()
+        async with self.get_session().post(url, data=data) as r:
+            r.raise_for_status()
+            return await r.json(content_type=None)
+
+
+    async def close(self) -> None:
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+
+# one client shared by every caller in this service
+CLIENT = HttpClient()
@@ -0,0 +1,158 @@
+from collections.abc import Mapping
+
+# IRCv3 tag value escapes, see https://ircv3.net/specs/extensions/message-tags
+ESCAPES = {":": ";", "s": " ", "\\": "\\", "r": "\r", "n": "\n"}
+
+class IrcMessage:
+    __slots__ = ("tags", "prefix", "command", "params")
+
+    def __init__(self, tags:dict, prefix:str, command:str, params:list):
+        self.tags = tags
+        self.prefix = prefix
+        self.command = command
+        self.params = params
+
+    # nick portion of a "nick!user@host" prefix
+    @property
+    def nick(self) -> str:
+        return self.prefix.split("!", 1)[0]
+
+    # PRIVMSG, USERNOTICE, CLEARCHAT and ROOMSTATE all target a channel first
+    @property
+    def channel(self) -> str:
+        if self.params and self.params[0].startswith("#"):
+            return self.params[0][1:]
+        return ""
+
+    # chat text for PRIVMSG/USERNOTICE, or the target user for CLEARCHAT
+    @property
+    def text(self) -> str:
+        if len(self.params) > 1:
+            return self.params[-1]
+        return ""
+
+    def __repr__(self) -> str:
+        return f"IrcMessage({self.command!r}, {self.params!r}, prefix={self.prefix!r})"
+
+
+def unescape(value:str) -> str:
+    if "\\" not in value:
+        return value
+
+    chars = []
+    i = 0
+    end = len(value)
+    while i < end:
+        c = value[i]
+        if c == "\\":
+            i += 1
+            # a trailing lone backslash is dropped
+            if i < end:
+                n = value[i]
+                chars.append(ESCAPES.get(n, n))
+        else:
+            chars.append(c)
+        i += 1
+    return "".join(chars)
+
+
+# the handler reads a handful of tags per line, so look them up in the raw string
+# and only build the full dict if something iterates over the tags
+class Tags(Mapping):
+    __slots__ = ("raw", "parsed")
+
+    def __init__(self, raw:str):
+        # with ";" at both ends every tag, first and last included, reads as ";key=value;"
+        self.raw = f";{raw};"
+        self.parsed = None
+
+    def get(self, key:str, default=None):
+        if self.parsed is not None:
+            return self.parsed.get(key, default)
+
+        # values can't hold an unescaped ";", so ";key=" only ever matches a tag
+        raw = self.raw
+        needle = ";" + key + "="
+        start = raw.find(needle)
+        if start == -1:
+            return default
+        start += len(needle)
+        value = raw[start:raw.find(";", start)]
+        return unescape(value) if "\\" in value else value
+
+    def __getitem__(self, key:str) -> str:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def as_dict(self) -> dict:
+        if self.parsed is None:
+            self.parsed = parse_tags(self.raw[1:-1])
+        return self.parsed
+
+    def __iter__(self):
+        return iter(self.as_dict())
+
+    def __len__(self) -> int:
+        return len(self.as_dict())
+
+    def __repr__(self) -> str:
+        return f"Tags({self.as_dict()!r})"
+
+
+def parse_tags(raw:str) -> dict:
+    tags = {}
+    for tag in raw.split(";"):
+        key, _, value = tag.partition("=")
+        if key:
+            tags[key] = unescape(value)
+    return tags
+
+
+# "broadcaster/1,subscriber/12" -> ["broadcaster", "subscriber"]
+def parse_badges(raw:str) -> list:
+    if not raw:
+        return []
+    return [b.partition("/")[0] for b in raw.split(",")]
+
+
+def parse(line:str) -> IrcMessage:
+    line = line.rstrip("\r\n")
+    pos = 0
+    tags = {}
+    prefix = ""
+
+    if line.startswith("@"):
+        end = line.find(" ")
+        if end == -1:
+            return IrcMessage(Tags(line[1:]), "", "", [])
+        tags = Tags(line[1:end])
+        pos = end + 1
+        while line.startswith(" ", pos):
+            pos += 1
+
+    if line.startswith(":", pos):
+        end = line.find(" ", pos)
+        if end == -1:
+            return IrcMessage(tags, line[pos + 1:], "", [])
+        prefix = line[pos + 1:end]
+        pos = end + 1
+        while line.startswith(" ", pos):
+            pos += 1
+
+    end = line.find(" ", pos)
+    if end == -1:
+        return IrcMessage(tags, prefix, line[pos:], [])
+    command = line[pos:end]
+    rest = line[end + 1:]
+
+    # everything after " :" is one trailing param that may contain spaces
+    if rest.startswith(":"):
+        params = [rest[1:]]
+    else:
+        middle, sep, trailing = rest.partition(" :")
+        params = middle.split()
+        if sep:
+            params.append(trailing)
+    return IrcMessage(tags, prefix, command, params)
@@ -1,10 +1,19 @@
 import asyncio
+import signal
 from chathandler import ChatHandler
 
 
 async def main():
     handler = ChatHandler()
-    await handler.run()
+
+    # docker stop sends SIGTERM; cancel run() so buffered messages get flushed
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+
+    try:
+        await handler.run()
+    finally:
+        await handler.close()
 
 
 if __name__ == "__main__":
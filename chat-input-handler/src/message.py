@@ -1,102 +1,101 @@
-import aiohttp
+import ircparser
 import os
-import re
-import json
-from command import Command
+import time
+import tracing
+from command import COMMAND_TIME, REGISTRY
+from commandcache import CACHE
+from cooldown import COOLDOWNS
 from datetime import datetime
-from user import TwitchUser
+from httpclient import CLIENT
+from registry import strip_trigger
+from user import USERS
 
 COMMAND_TRIGGER = os.environ["COMMAND_TRIGGER"]
-SUBCLASSES = (c() for c in Command.__subclasses__())
-HARD_COMMANDS = {s.command_name.lstrip(COMMAND_TRIGGER): s for s in SUBCLASSES}
 
 DB_API = os.environ["DB_API"]
 DB_API_PORT = os.environ["DB_API_PORT"]
 DATABASE = f"http://{DB_API}:{DB_API_PORT}"
 
+# reply priorities understood by the bot's outbound queue; lower is sent first
+PRIORITY_MOD = 0
+PRIORITY_COMMAND = 1
+
+TEXT_COMMAND_TIME = COMMAND_TIME.labels("text")
+
 class TwitchMessage:
-    def __init__(self, sent_time:str, message:str) -> None:
+    def __init__(self, sent_time:str, message:str, trace:dict=None) -> None:
         self.platform = "twitch"
         self.sent_time = sent_time
         self.message = message
-
-        self.message_data = self.parse(self.message)
-        self.text = self.message_data.get("message", "")
-        self.sender = TwitchUser(
-            self.message_data.get("user-id", ""),
-            self.message_data.get("display-name", ""),
-            self.message_data.get("badges", []),
-            self.message_data.get("color", "")
+        self.trace = trace
+        self.received = tracing.now()
+
+        self.irc = ircparser.parse(self.message)
+        self.is_chat = self.irc.command == "PRIVMSG"
+        self.text = self.irc.text if self.is_chat else ""
+        self.channel = self.irc.channel
+
+        tags = self.irc.tags
+        self.sender = USERS.get(
+            tags.get("user-id", ""),
+            tags.get("display-name", ""),
+            tags.get("badges", ""),
+            tags.get("color", "")
         )
         
-        self.store = True
+        self.store = self.is_chat
         self.is_command = False
         self.command_name = ""
         if self.text.startswith(COMMAND_TRIGGER):
             self.is_command = True
-            self.command_name = self.text.split()[0].lstrip(COMMAND_TRIGGER)
+            self.command_name = strip_trigger(self.text.split()[0])
+            if self.trace:
+                self.trace["command"] = self.command_name
         self.reply = None
-        self.display()
-
-
-    def parse(self, message:str) -> dict:
-        if "PRIVMSG" in message:
-            all_tags = message.split()[0]
-            text = message.split("PRIVMSG", maxsplit=1)[1].split(":", maxsplit=1)[-1].strip()
-            output = {"message":text}
 
-            tag_strings = all_tags.split(";") 
-            required_tags = ["user-id", "display-name", "badges", "color"]
-            for t in tag_strings:
-                k,v = t.split("=")
-                if k in required_tags:
-                    if k == "badges":
-                        v = [b[0] for b in (e.split("/") for e in v.split(","))]
-                    output[k] = v
-            return output
+        # outbound replies to mods go first, then other command replies
+        if self.sender.is_mod or self.sender.is_broadcaster:
+            self.priority = PRIORITY_MOD
+        else:
+            self.priority = PRIORITY_COMMAND
 
 
-    def display(self) -> None:
-        r,g,b = self.sender.color
-        print(f"\033[38;2;{r};{g};{b}m" + self.sender.display_name + 
-                "\033[38;2;255;255;255m", f"{self.text}\n")
-
-
-    # wrapper around aiohttp get logic
+    # wrapper around the shared http client
     async def aio_get(self, url:str) -> dict:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as r:
-                response = await r.json()
-                return response
+        return await CLIENT.get(url)
 
 
-    # wrapper around aiohttp post logic
+    # wrapper around the shared http client
     async def aio_post(self, url:str, payload:dict) -> None:
-        data = json.dumps(payload).encode("ascii")
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, data=data): 
-                return
+        await CLIENT.post(url, payload)
 
 
     async def update_reply(self) -> None:
         if self.is_command:
+            # mods and the broadcaster skip cooldowns; throttled commands get no reply
+            user_is_priv = (self.sender.is_mod or self.sender.is_broadcaster)
+
             # update reply from command object
-            if self.command_name in HARD_COMMANDS:
-                command = HARD_COMMANDS[self.command_name]
+            command = REGISTRY.get(self.command_name)
+            if command is not None:
                 self.store = command.store
-                user_is_priv = (self.sender.is_mod or self.sender.is_broadcaster)
 
                 if command.restricted and not user_is_priv:
                     sender_name = self.sender.display_name
                     self.reply = f"You need to be a mod to use that command, {sender_name}."
-                else:
-                    self.reply = await command.execute(self.sender, self.text)
+
+                # privacy commands that aren't stored, like forgetme, are never refused by a cooldown
+                elif (user_is_priv or not command.store or
+                        COOLDOWNS.allow(self.sender.user_id, self.command_name)):
+                    self.reply = await command.run(self.sender, self.text)
 
             # command is not a hard_command
             else:
-                # get command output from DB/cache
-                text_commands = await self.aio_get(f"{DATABASE}/commands/get-all/twitch/")
-                if self.command_name in text_commands:
-                    response_url = f"{DATABASE}/commands/output/twitch/{self.command_name}/"
-                    response = await self.aio_get(response_url)
-                    self.reply = response["output"]
+                # the cache holds every text command, so an unknown name is a miss in memory
+                # and never reaches the db api; only commands that exist use up cooldowns
+                start = time.monotonic()
+                text_command = await CACHE.get(self.platform, self.command_name)
+                if text_command and (user_is_priv or
+                        COOLDOWNS.allow(self.sender.user_id, self.command_name)):
+                    self.reply = text_command["output"]
+                    TEXT_COMMAND_TIME.observe(time.monotonic() - start)
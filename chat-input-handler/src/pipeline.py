@@ -0,0 +1,125 @@
+import asyncio
+import metrics
+import os
+import time
+from collections import deque
+
+# number of messages processed at once, and how many may wait before reading stops
+MAX_WORKERS = int(os.environ.get("CHAT_WORKERS", 16))
+MAX_PENDING = int(os.environ.get("CHAT_MAX_PENDING", 1000))
+
+STAGE_TIME = metrics.histogram(
+        "chat_pipeline_stage_seconds", "Time spent per pipeline stage", ("stage",)
+        )
+
+class StageStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds:float) -> None:
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def as_dict(self) -> dict:
+        mean = self.total / self.count if self.count else 0.0
+        return {"count": self.count, "mean_ms": mean * 1000, "max_ms": self.max * 1000}
+
+
+class Pipeline:
+    def __init__(self, process, workers:int=MAX_WORKERS, max_pending:int=MAX_PENDING):
+        self.process = process
+        self.workers = workers
+        self.slots = asyncio.Semaphore(max_pending)
+
+        # keys with queued work, and the queued items per key in arrival order
+        self.ready = asyncio.Queue()
+        self.pending = {}
+
+        self.depth = 0
+        self.in_flight = 0
+        self.stages = {}
+        self.histograms = {}
+        self.tasks = []
+
+        metrics.gauge("chat_pipeline_queue_depth", "Messages queued or in flight",
+                      function=lambda: self.depth)
+        metrics.gauge("chat_pipeline_in_flight", "Messages being processed",
+                      function=lambda: self.in_flight)
+
+
+    def record(self, stage:str, seconds:float) -> None:
+        stats = self.stages.get(stage)
+        if stats is None:
+            stats = self.stages[stage] = StageStats()
+            self.histograms[stage] = STAGE_TIME.labels(stage)
+        stats.observe(seconds)
+        self.histograms[stage].observe(seconds)
+
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.depth,
+            "in_flight": self.in_flight,
+            "stages": {name: s.as_dict() for name, s in self.stages.items()}
+        }
+
+
+    def start(self) -> None:
+        self.tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+
+
+    # wait for queued work to finish, up to timeout seconds
+    async def drain(self, timeout:float) -> None:
+        deadline = time.monotonic() + timeout
+        while self.depth and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+
+    # queue an item; items sharing a key are processed one at a time, in order
+    async def submit(self, key:str, item) -> None:
+        start = time.monotonic()
+        await self.slots.acquire()
+        self.record("backpressure", time.monotonic() - start)
+
+        self.depth += 1
+        queue = self.pending.get(key)
+        if queue is None:
+            self.pending[key] = deque([(item, time.monotonic())])
+            self.ready.put_nowait(key)
+        else:
+            queue.append((item, time.monotonic()))
+
+
+    async def worker(self) -> None:
+        while True:
+            key = await self.ready.get()
+            queue = self.pending[key]
+
+            # drain this key's queue so its items never run concurrently
+            while queue:
+                item, queued_at = queue[0]
+                start = time.monotonic()
+                self.record("queue_wait", start - queued_at)
+                self.in_flight += 1
+                try:
+                    await self.process(item)
+                except Exception as e:
+                    print(f"Error processing message: {e}")
+                finally:
+                    self.in_flight -= 1
+                    self.depth -= 1
+                    self.record("process", time.monotonic() - start)
+                    queue.popleft()
+                    self.slots.release()
+            del self.pending[key]
@@ -0,0 +1,63 @@
+import os
+from importlib import metadata
+from types import MappingProxyType
+
+TRIGGER = os.environ["COMMAND_TRIGGER"]
+
+# installed packages can add commands by exposing Command subclasses in this group
+PLUGIN_GROUP = "chatbot.commands"
+
+# "!!help" -> "help"; unlike str.lstrip this only removes the trigger once
+def strip_trigger(name:str) -> str:
+    return name[len(TRIGGER):] if name.startswith(TRIGGER) else name
+
+
+def load_plugins(group:str=PLUGIN_GROUP) -> list:
+    entry_points = metadata.entry_points()
+
+    # python 3.10+ returns a selectable collection, older versions a dict of groups
+    if hasattr(entry_points, "select"):
+        entry_points = entry_points.select(group=group)
+    else:
+        entry_points = entry_points.get(group, ())
+
+    plugins = []
+    for entry_point in entry_points:
+        try:
+            plugins.append(entry_point.load())
+        except Exception as e:
+            print(f"Could not load command plugin {entry_point.name}: {e}")
+    return plugins
+
+
+class CommandRegistry:
+    # built once; lookups, help text and listings never change afterwards
+    def __init__(self, commands:list):
+        index = {}
+        for command in commands:
+            for name in (command.command_name, *command.aliases):
+                key = strip_trigger(name)
+                if key in index:
+                    print(f"Command {key} is already registered, ignoring {type(command).__name__}")
+                    continue
+                index[key] = command
+
+        self.index = MappingProxyType(index)
+        self.help = MappingProxyType({key: c.help for key, c in index.items()})
+
+        # hard command listings for regular users and for mods and the broadcaster
+        registered = set(index.values())
+        self.public_names = tuple(sorted(c.command_name for c in registered if not c.restricted))
+        self.all_names = tuple(sorted(c.command_name for c in registered))
+
+
+    def __contains__(self, name:str) -> bool:
+        return name in self.index
+
+
+    def get(self, name:str):
+        return self.index.get(name)
+
+
+    def names(self, privileged:bool) -> tuple:
+        return self.all_names if privileged else self.public_names
@@ -1,31 +1,94 @@
 import colorsys
+import ircparser
+import os
 import random
+from collections import OrderedDict
 
 TWITCH_PURPLE = (145, 70, 255)
- 
+
+# chatters whose profiles are kept between messages; the least recently seen go first
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 10000))
+
+# the user's chosen colour, or Twitch purple if it would be hard to read
+def readable_color(color:str) -> tuple:
+    # set color if user has chosen a custom color in settings
+    if not color:
+        return TWITCH_PURPLE
+
+    r,g,b = tuple(int(color[i:i+2], 16) for i in (1,3,5))
+    h,s,v = colorsys.rgb_to_hsv(r,g,b)
+    if s < .55 and v < 50:
+        return TWITCH_PURPLE
+    elif s < .66 and v < 62:
+        return TWITCH_PURPLE
+    elif s <.78 and v < 73:
+        return TWITCH_PURPLE
+    elif s < .85 and v < 80:
+        return TWITCH_PURPLE
+    elif s > .9 and v < 90:
+        return TWITCH_PURPLE
+    return (r,g,b)
+
+
 class TwitchUser:
-    def __init__(self, user_id="", display_name="", roles=[], color=""):
+    __slots__ = ("user_id", "display_name", "roles", "is_broadcaster", "is_mod",
+                 "color_tag", "_username", "_color")
+
+    def __init__(self, user_id="", display_name="", roles=(), color=""):
         self.user_id = user_id
         self.display_name = display_name
-        self.username = self.display_name.lower()
         self.roles = roles
         self.is_broadcaster = "broadcaster" in roles
         self.is_mod = "mod" in roles
 
-        # set color if user has chosen a custom color in settings
-        if color:
-            r,g,b = tuple(int(color[i:i+2], 16) for i in (1,3,5))
-            h,s,v = colorsys.rgb_to_hsv(r,g,b)
-            self.color = (r,g,b)
-            if s < .55 and v < 50:
-                self.color = TWITCH_PURPLE
-            elif s < .66 and v < 62:
-                self.color = TWITCH_PURPLE
-            elif s <.78 and v < 73:
-                self.color = TWITCH_PURPLE
-            elif s < .85 and v < 80:
-                self.color = TWITCH_PURPLE
-            elif s > .9 and v < 90:
-                self.color = TWITCH_PURPLE
-        else:
-            self.color = TWITCH_PURPLE
+        # worked out on first use, since most messages never need them
+        self.color_tag = color
+        self._username = None
+        self._color = None
+
+    @property
+    def username(self) -> str:
+        if self._username is None:
+            self._username = self.display_name.lower()
+        return self._username
+
+    @property
+    def color(self) -> tuple:
+        if self._color is None:
+            self._color = readable_color(self.color_tag)
+        return self._color
+
+
+class UserCache:
+    def __init__(self, max_users:int=USER_CACHE_SIZE):
+        self.max_users = max_users
+
+        # user id -> (badges tag, profile)
+        self.users = OrderedDict()
+
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+
+    # reuse the profile from this user's last message unless their name, badges or colour changed
+    def get(self, user_id:str, display_name:str, badges:str, color:str) -> TwitchUser:
+        entry = self.users.get(user_id)
+        if entry is not None:
+            seen_badges, user = entry
+            if (seen_badges == badges and user.display_name == display_name
+                    and user.color_tag == color):
+                self.users.move_to_end(user_id)
+                return user
+
+        user = TwitchUser(user_id, display_name, ircparser.parse_badges(badges), color)
+        if user_id:
+            self.users[user_id] = (badges, user)
+            self.users.move_to_end(user_id)
+            if len(self.users) > self.max_users:
+                self.users.popitem(last=False)
+        return user
+
+
+# one cache shared by every message in this service
+USERS = UserCache()
@@ -0,0 +1,12 @@
+import os
+import sys
+
+# services import their modules flat from src/, as they do in the container
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# settings the modules read at import; .env provides them when deployed
+os.environ.setdefault("DB_API", "db_api")
+os.environ.setdefault("DB_API_PORT", "1337")
+os.environ.setdefault("ZMQ_PORT", "5555")
+os.environ.setdefault("COMMANDS_TOPIC", "command_updates")
+os.environ.setdefault("COMMAND_TRIGGER", "!!")
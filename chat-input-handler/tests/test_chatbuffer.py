@@ -0,0 +1,160 @@
+import asyncio
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import chatbuffer
+from chatbuffer import ChatBuffer, SUCCESS
+from httpclient import CLIENT
+
+FAILURE = {"status": "failure"}
+
+
+# answers like db-api's batch endpoint: 422 for a batch holding a "bad" row, 503
+# while its database is down, and no answer at all while it's down itself
+class StubDatabase:
+    def __init__(self):
+        self.stored = []
+        self.posts = []
+        self.database_down = False
+        self.down_after = None
+        self.delay = 0
+
+    async def store_batch(self, request:web.Request) -> web.Response:
+        batch = await request.json()
+        self.posts.append(len(batch))
+        await asyncio.sleep(self.delay)
+        if self.down_after is not None and len(self.posts) > self.down_after:
+            self.database_down = True
+        if self.database_down:
+            return web.json_response(FAILURE, status=503)
+        if any(m.get("bad") for m in batch):
+            return web.json_response(FAILURE, status=422)
+        self.stored.extend(batch)
+        return web.json_response(SUCCESS)
+
+
+def with_db(test):
+    db = StubDatabase()
+    app = web.Application()
+    app.router.add_post("/chat/store/batch/", db.store_batch)
+
+    async def run():
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            await test(db, ChatBuffer(str(server.make_url("/chat/store/batch/"))))
+        finally:
+            await CLIENT.close()
+            await server.close()
+    asyncio.run(run())
+    return db
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    monkeypatch.setattr(chatbuffer, "FLUSH_SIZE", 10)
+
+
+def messages(n:int, bad=()) -> list:
+    return [{"n": i, "bad": i in bad} for i in range(n)]
+
+
+def test_posts_are_capped_at_flush_size():
+    async def test(db, buffer):
+        for m in messages(25):
+            buffer.add(m)
+        assert await buffer.flush()
+        assert db.posts == [10, 10, 5]
+        assert [m["n"] for m in db.stored] == list(range(25))
+        assert buffer.messages == []
+    with_db(test)
+
+
+def test_refused_rows_are_dropped_and_counted():
+    async def test(db, buffer):
+        for m in messages(10, bad={3, 7}):
+            buffer.add(m)
+        assert await buffer.flush()
+        assert buffer.rejected == 2
+        assert sorted(m["n"] for m in db.stored) == [0, 1, 2, 4, 5, 6, 8, 9]
+        assert buffer.messages == []
+
+        # nothing is retried once the bad rows are gone
+        db.posts.clear()
+        assert await buffer.flush()
+        assert db.posts == []
+    with_db(test)
+
+
+def test_database_down_keeps_every_row():
+    async def test(db, buffer):
+        for m in messages(100):
+            buffer.add(m)
+        db.database_down = True
+        assert not await buffer.flush()
+        assert db.posts == [10]
+        assert buffer.rejected == 0
+        assert [m["n"] for m in buffer.messages] == list(range(100))
+
+        db.database_down = False
+        assert await buffer.flush()
+        assert [m["n"] for m in db.stored] == list(range(100))
+    with_db(test)
+
+
+def test_db_api_unreachable_keeps_every_row():
+    buffer = ChatBuffer("http://127.0.0.1:9/chat/store/batch/")
+    for m in messages(15):
+        buffer.add(m)
+
+    async def run():
+        try:
+            return await buffer.flush()
+        finally:
+            await CLIENT.close()
+    assert not asyncio.run(run())
+    assert [m["n"] for m in buffer.messages] == list(range(15))
+    assert buffer.rejected == 0
+
+
+def test_database_failing_while_splitting_keeps_unsent_rows():
+    async def test(db, buffer):
+        for m in messages(10, bad={8}):
+            buffer.add(m)
+
+        # the database goes away after the whole batch is refused and the first half stored
+        db.down_after = 2
+
+        assert not await buffer.flush()
+        assert [m["n"] for m in db.stored] == [0, 1, 2, 3, 4]
+        assert [m["n"] for m in buffer.messages] == [5, 6, 7, 8, 9]
+    with_db(test)
+
+
+def test_close_waits_for_the_batch_in_flight():
+    async def test(db, buffer):
+        db.delay = 0.2
+        for m in messages(150):
+            buffer.add(m)
+        buffer.start()
+        while not db.posts:
+            await asyncio.sleep(0.01)
+        await buffer.close()
+        assert sorted(m["n"] for m in db.stored) == list(range(150))
+        assert buffer.messages == []
+    with_db(test)
+
+
+def test_cancelled_flush_puts_its_batch_back():
+    async def test(db, buffer):
+        db.delay = 1
+        for m in messages(15):
+            buffer.add(m)
+        flush = asyncio.ensure_future(buffer.flush())
+        while not db.posts:
+            await asyncio.sleep(0.01)
+        flush.cancel()
+        await asyncio.gather(flush, return_exceptions=True)
+        assert [m["n"] for m in buffer.messages] == list(range(15))
+    with_db(test)
@@ -0,0 +1,148 @@
+import asyncio
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import command
+from command import CircuitBreaker, Command
+from httpclient import CLIENT
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+# a command backed by a stub api whose behaviour each test sets
+class Lookup(Command):
+    command_name = "!!lookup"
+    timeout = 0.2
+
+    def __init__(self, url:str):
+        self.url = url
+
+    async def execute(self, user=None, message=""):
+        return (await self.aio_get(self.url))["reply"]
+
+
+class StubApi:
+    def __init__(self):
+        self.mode = "ok"
+        self.calls = 0
+
+    async def handle(self, request:web.Request) -> web.Response:
+        self.calls += 1
+        if self.mode == "slow":
+            await asyncio.sleep(1)
+        if self.mode == "error":
+            return web.Response(status=500, text="broken")
+        return web.json_response({"reply": "found it"})
+
+
+def with_stub(test):
+    api = StubApi()
+    app = web.Application()
+    app.router.add_get("/", api.handle)
+
+    async def run():
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            await test(api, Lookup(str(server.make_url("/"))))
+        finally:
+            await CLIENT.close()
+            await server.close()
+    asyncio.run(run())
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(command, "BREAKERS", {})
+
+
+def test_breaker_admits_one_probe_when_half_open():
+    clock = FakeClock()
+    breaker = CircuitBreaker(threshold=2, reset_after=30, clock=clock)
+    breaker.failure()
+    assert breaker.allow()
+    breaker.failure()
+    assert not breaker.allow()
+
+    clock.now += 30
+    assert breaker.allow()
+    assert not breaker.allow()
+    assert not breaker.allow()
+
+    # a failed probe reopens the circuit for another full reset period
+    breaker.failure()
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.allow() and breaker.allow()
+
+
+def test_breaker_probes_again_if_probe_never_reports():
+    clock = FakeClock()
+    breaker = CircuitBreaker(threshold=1, reset_after=30, clock=clock)
+    breaker.failure()
+    clock.now += 30
+    assert breaker.allow()
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+
+def test_command_replies_from_stub_api():
+    async def test(api, lookup):
+        assert await lookup.run() == "found it"
+    with_stub(test)
+
+
+def test_command_timeout_and_error_replies():
+    async def test(api, lookup):
+        api.mode = "slow"
+        assert await lookup.run() == command.TIMEOUT_REPLY
+        api.mode = "error"
+        assert await lookup.run() == command.ERROR_REPLY
+        assert lookup.breaker.failures == 2
+    with_stub(test)
+
+
+def test_open_breaker_fails_fast_then_probes_once(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setitem(command.BREAKERS, "!!lookup", CircuitBreaker(3, 30, clock))
+
+    async def test(api, lookup):
+        api.mode = "error"
+        for _ in range(3):
+            assert await lookup.run() == command.ERROR_REPLY
+        assert await lookup.run() == command.UNAVAILABLE_REPLY
+        assert api.calls == 3
+
+        # concurrent calls once the reset time passes: only the probe reaches the api
+        api.mode = "slow"
+        clock.now += 30
+        replies = await asyncio.gather(*(lookup.run() for _ in range(5)))
+        assert api.calls == 4
+        assert replies.count(command.TIMEOUT_REPLY) == 1
+        assert replies.count(command.UNAVAILABLE_REPLY) == 4
+
+        api.mode = "ok"
+        clock.now += 30
+        assert await lookup.run() == "found it"
+        assert await lookup.run() == "found it"
+    with_stub(test)
+
+
+def test_metrics_label_commands_without_trigger():
+    async def test(api, lookup):
+        await lookup.run()
+    with_stub(test)
+    assert ("lookup",) in command.COMMAND_TIME.children
+    assert ("!!lookup",) not in command.COMMAND_TIME.children
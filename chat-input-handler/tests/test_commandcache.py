@@ -0,0 +1,85 @@
+import aiohttp
+import asyncio
+import pytest
+
+import commandcache
+from commandcache import TextCommandCache
+from httpclient import CLIENT
+
+DUMP = [{"command": "discord", "output": "Join the Discord!", "help_output": "Links the Discord."}]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+# stands in for the db api's command dump, which can be taken down
+class StubApi:
+    def __init__(self):
+        self.down = False
+        self.requests = 0
+
+    async def get(self, url, headers=None):
+        self.requests += 1
+        if self.down:
+            raise aiohttp.ClientConnectionError("db api unreachable")
+        return DUMP
+
+
+@pytest.fixture
+def api(monkeypatch):
+    api = StubApi()
+    monkeypatch.setattr(CLIENT, "get", api.get)
+    return api
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(commandcache.time, "monotonic", clock)
+    return clock
+
+
+def test_db_api_down_at_startup(api, clock):
+    cache = TextCommandCache()
+    api.down = True
+
+    async def run():
+        assert await cache.ensure("twitch") == {}
+        assert await cache.get("twitch", "discord") is None
+
+        # the failed load backs off instead of retrying on every lookup
+        assert api.requests == 1
+        api.down = False
+        clock.now += commandcache.RETRY_DELAY
+        return await cache.get("twitch", "discord")
+    assert asyncio.run(run())["output"] == "Join the Discord!"
+    assert api.requests == 2
+
+
+def test_outage_after_ttl_serves_last_loaded_commands(api, clock):
+    cache = TextCommandCache()
+
+    async def run():
+        await cache.ensure("twitch")
+        api.down = True
+        clock.now += commandcache.CACHE_TTL
+        replies = [await cache.get("twitch", "discord") for _ in range(10)]
+        assert all(r["output"] == "Join the Discord!" for r in replies)
+        assert api.requests == 2
+
+        # retries double up to the ttl
+        delays = []
+        for _ in range(12):
+            before = clock.now
+            clock.now = cache.retry_at["twitch"]
+            await cache.get("twitch", "discord")
+            delays.append(clock.now - before)
+        return delays
+    delays = asyncio.run(run())
+    assert delays[:3] == [1, 2, 4]
+    assert max(delays) == commandcache.CACHE_TTL
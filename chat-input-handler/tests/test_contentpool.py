@@ -0,0 +1,49 @@
+import os
+import threading
+
+from contentpool import ContentPool
+
+
+async def nothing() -> list:
+    return []
+
+
+def pool(tmp_path, name:str="jokes") -> ContentPool:
+    p = ContentPool(name, nothing, 500, low_watermark=0, recent=3)
+    p.path = str(tmp_path / f"{name}.json")
+    return p
+
+
+def test_snapshot_round_trip(tmp_path):
+    saved = pool(tmp_path)
+    for item in ("one", "two", "three"):
+        saved.add(item)
+    saved.take()
+    saved.save()
+    assert os.listdir(tmp_path) == ["jokes.json"]
+
+    loaded = pool(tmp_path)
+    loaded.load()
+    assert list(loaded.items) == ["two", "three"]
+    assert not loaded.add("one")
+
+
+def test_concurrent_saves_never_leave_a_torn_snapshot(tmp_path):
+    pools = [pool(tmp_path) for _ in range(4)]
+    for i, p in enumerate(pools):
+        for j in range(200):
+            p.add(f"{i}-{j}")
+
+    def save_many(p):
+        for _ in range(25):
+            p.save()
+    threads = [threading.Thread(target=save_many, args=(p,)) for p in pools]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert os.listdir(tmp_path) == ["jokes.json"]
+    loaded = pool(tmp_path)
+    loaded.load()
+    assert len(loaded) == 200
@@ -0,0 +1,58 @@
+import asyncio
+import json
+import pytest
+import threading
+
+import display
+from user import TwitchUser
+
+
+class Message:
+    def __init__(self, text:str):
+        self.sent_time = "2026-01-01 00:00:00"
+        self.sender = TwitchUser("42", "Viewer", (), "#ff0000")
+        self.text = text
+
+
+def test_buffered_display_requires_render_and_write():
+    with pytest.raises(TypeError):
+        display.BufferedDisplay()
+
+
+def test_render_and_write_run_off_the_event_loop():
+    threads = set()
+
+    class Recording(display.BufferedDisplay):
+        def __init__(self):
+            super().__init__()
+            self.output = []
+
+        def render(self, sent_time, sender, text):
+            threads.add(threading.get_ident())
+            return text + "\n"
+
+        def write(self, output):
+            threads.add(threading.get_ident())
+            self.output.append(output)
+
+    async def run():
+        out = Recording()
+        out.add(Message("one"))
+        out.add(Message("two"))
+        await out.flush()
+        return out.output, threading.get_ident()
+
+    output, loop_thread = asyncio.run(run())
+    assert output == ["one\ntwo\n"]
+    assert threads and loop_thread not in threads
+
+
+def test_log_display_writes_json_lines(tmp_path):
+    path = tmp_path / "chat.log"
+    out = display.LogDisplay(str(path), max_buffered=1)
+    out.add(Message("kept"))
+    out.add(Message("dropped"))
+    asyncio.run(out.flush())
+    lines = [json.loads(l) for l in path.read_text().splitlines()]
+    assert [l["message"] for l in lines] == ["kept"]
+    assert lines[0]["display_name"] == "Viewer"
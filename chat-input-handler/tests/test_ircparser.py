@@ -0,0 +1,142 @@
+import os
+import pytest
+from hypothesis import given, strategies as st
+
+import ircparser
+
+CAPTURE = os.path.join(os.path.dirname(__file__), "data", "twitch_capture.txt")
+
+def captured_lines() -> list:
+    with open(CAPTURE) as f:
+        return [l.rstrip("\r\n") for l in f if l.strip()]
+
+
+# inverse of ircparser.unescape, per the IRCv3 message-tags spec
+def escape(value:str) -> str:
+    return (value.replace("\\", "\\\\").replace(";", "\\:").replace(" ", "\\s")
+                 .replace("\r", "\\r").replace("\n", "\\n"))
+
+
+tag_keys = st.text(alphabet="abcdefghijklmnopqrstuvwxyz0123456789-/.", min_size=1, max_size=20)
+tag_values = st.text(max_size=40)
+tag_dicts = st.dictionaries(tag_keys, tag_values, max_size=15)
+channels = st.text(alphabet="abcdefghijklmnopqrstuvwxyz0123456789_", min_size=1, max_size=25)
+chat_text = st.text(max_size=200).filter(lambda t: "\r" not in t and "\n" not in t)
+
+
+def raw_tags(tags:dict) -> str:
+    return ";".join(f"{k}={escape(v)}" for k, v in tags.items())
+
+
+@pytest.mark.parametrize("line", captured_lines())
+def test_captured_lines_parse(line):
+    irc = ircparser.parse(line)
+    assert irc.command
+    if irc.command == "PRIVMSG":
+        assert irc.channel == "mitchsworkshop"
+        assert irc.tags.get("user-id")
+        assert irc.text
+
+
+def test_privmsg_fields():
+    line = captured_lines()[0]
+    irc = ircparser.parse(line)
+    assert irc.command == "PRIVMSG"
+    assert irc.nick == "mitchsworkshop"
+    assert irc.text == "!!commands"
+    assert irc.tags["display-name"] == "MitchsWorkshop"
+    assert irc.tags.get("user-type") == ""
+    assert irc.tags.get("missing", "default") == "default"
+    assert ircparser.parse_badges(irc.tags["badges"]) == ["broadcaster", "subscriber"]
+
+
+def test_trailing_text_keeps_colons_and_equals():
+    irc = ircparser.parse(captured_lines()[2])
+    assert irc.text == "hi everyone, first time here: what language is this?"
+    irc = ircparser.parse(captured_lines()[3])
+    assert irc.text == "a=b; c=d"
+
+
+def test_usernotice_unescapes_system_message():
+    irc = ircparser.parse(captured_lines()[4])
+    assert irc.command == "USERNOTICE"
+    assert irc.channel == "mitchsworkshop"
+    assert irc.text == "three months already"
+    assert irc.tags["system-msg"] == "SubGuy subscribed at Tier 1. They've subscribed for 3 months!"
+    assert irc.tags["msg-param-sub-plan-name"] == "Channel Subscription (mitchsworkshop)"
+
+
+def test_usernotice_without_text():
+    irc = ircparser.parse(captured_lines()[5])
+    assert irc.command == "USERNOTICE"
+    assert irc.tags["msg-id"] == "raid"
+    assert irc.text == ""
+
+
+def test_clearchat():
+    ban = ircparser.parse(captured_lines()[6])
+    assert ban.command == "CLEARCHAT"
+    assert ban.text == "spammer"
+    assert ban.tags["ban-duration"] == "600"
+
+    clear = ircparser.parse(captured_lines()[7])
+    assert clear.command == "CLEARCHAT"
+    assert clear.channel == "mitchsworkshop"
+    assert clear.text == ""
+
+
+def test_roomstate():
+    irc = ircparser.parse(captured_lines()[8])
+    assert irc.command == "ROOMSTATE"
+    assert irc.channel == "mitchsworkshop"
+    assert irc.tags["followers-only"] == "-1"
+    assert dict(irc.tags)["slow"] == "0"
+
+
+def test_ping():
+    irc = ircparser.parse("PING :tmi.twitch.tv")
+    assert irc.command == "PING"
+    assert irc.params == ["tmi.twitch.tv"]
+    assert irc.tags == {}
+    assert irc.prefix == ""
+
+
+@pytest.mark.parametrize("line", [
+    "", "@", "@a=b", "@a=b ", ":prefix", ":prefix ", "PRIVMSG", "  ", "@a=b :p",
+    "@;;;= :p PRIVMSG", "PRIVMSG #chan", "PRIVMSG #chan :", "\r\n", "@\\ :\\ \\"
+])
+def test_malformed_lines_do_not_raise(line):
+    irc = ircparser.parse(line)
+    assert isinstance(irc.params, list)
+    irc.channel, irc.text, irc.nick, dict(irc.tags)
+
+
+@given(tag_dicts)
+def test_escaped_tags_round_trip(tags):
+    parsed = ircparser.Tags(raw_tags(tags))
+    assert dict(parsed) == tags
+    for key, value in tags.items():
+        assert ircparser.Tags(raw_tags(tags)).get(key) == value
+
+
+@given(tag_values)
+def test_unescape_inverts_escape(value):
+    assert ircparser.unescape(escape(value)) == value
+
+
+@given(tag_dicts, channels, chat_text)
+def test_privmsg_round_trip(tags, channel, text):
+    line = f":nick!nick@nick.tmi.twitch.tv PRIVMSG #{channel} :{text}"
+    if tags:
+        line = f"@{raw_tags(tags)} {line}"
+    irc = ircparser.parse(line)
+    assert irc.command == "PRIVMSG"
+    assert irc.nick == "nick"
+    assert irc.channel == channel
+    assert irc.text == text
+    assert dict(irc.tags) == tags
+
+
+@given(st.text())
+def test_parse_never_raises(line):
+    ircparser.parse(line)
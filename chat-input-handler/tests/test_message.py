@@ -0,0 +1,70 @@
+import asyncio
+import pytest
+
+import message
+from commandcache import TextCommandCache
+from cooldown import Cooldowns, GLOBAL_LIMIT, USER_LIMIT
+from httpclient import CLIENT
+from message import TwitchMessage
+
+
+def privmsg(text:str, user_id:str="42", badges:str="") -> str:
+    return (f"@badges={badges};color=;display-name=Viewer;user-id={user_id} "
+            f":viewer!viewer@viewer.tmi.twitch.tv PRIVMSG #channel :{text}")
+
+
+def reply(text:str, **kwargs) -> str:
+    msg = TwitchMessage("2026-01-01 00:00:00", privmsg(text, **kwargs))
+    asyncio.run(msg.update_reply())
+    return msg.reply
+
+
+DUMP = [{"command": "discord", "output": "Join the Discord!", "help_output": "Links the Discord."}]
+
+
+# stands in for the db api; returns the urls it was asked for
+@pytest.fixture(autouse=True)
+def stubs(monkeypatch):
+    requests = []
+
+    async def get(url, headers=None):
+        requests.append(url)
+        return DUMP
+
+    async def post(url, payload):
+        return {"status": "success"}
+
+    monkeypatch.setattr(message, "COOLDOWNS", Cooldowns())
+    monkeypatch.setattr(message, "CACHE", TextCommandCache())
+    monkeypatch.setattr(CLIENT, "get", get)
+    monkeypatch.setattr(CLIENT, "post", post)
+    return requests
+
+
+def test_text_command_cooldown():
+    replies = [reply("!!discord") for _ in range(USER_LIMIT + 1)]
+    assert replies[:USER_LIMIT] == ["Join the Discord!"] * USER_LIMIT
+    assert replies[-1] is None
+
+
+def test_unknown_commands_use_no_cooldown(stubs):
+    # ordinary chat that happens to start with the trigger
+    for i in range(GLOBAL_LIMIT + 5):
+        assert reply(f"!!word{i}", user_id=str(i)) is None
+    assert reply("!!discord", user_id="viewer") == "Join the Discord!"
+
+    # every miss was answered from the one loaded dump, with no limiter keys made for it
+    assert len(stubs) == 1
+    assert len(message.COOLDOWNS.command) == 1
+
+
+def test_broadcaster_skips_cooldowns(stubs):
+    for _ in range(USER_LIMIT + 2):
+        assert reply("!!discord", badges="broadcaster/1") == "Join the Discord!"
+
+
+def test_forgetme_is_never_throttled():
+    for _ in range(USER_LIMIT):
+        reply("!!discord")
+    assert reply("!!discord") is None
+    assert reply("!!forgetme") == "Your data has been removed, Viewer!"
@@ -1,7 +1,10 @@
 import asyncio
 import os 
 import uuid
-import json
+import envelope
+import metrics
+import tracing
+import transport
 import zmq
 import zmq.asyncio
 from dataclasses import dataclass
@@ -15,6 +18,10 @@ CHAT_ADDRESS = f"tcp://{BACKEND}:{PORT}"
 # zmq PUB socket address
 TWITCH_ADDRESS = f"tcp://0.0.0.0:{PORT}"
 
+RECEIVED = metrics.counter("chat_output_received_total", "Replies received from the backend")
+ROUTED = metrics.counter("chat_output_routed_total", "Replies routed per platform", ("platform",))
+DROPPED = metrics.counter("chat_output_dropped_total", "Replies that could not be routed")
+
 @dataclass
 class OutputHandler:
     context: zmq.asyncio.Context = zmq.asyncio.Context()
@@ -23,7 +30,7 @@ class OutputHandler:
     twitch_address: str = TWITCH_ADDRESS
     twitch_queue: str = os.environ["TWITCH_OUT_TOPIC"]
 
-    def format_output(self, payload:dict) -> str:
+    def format_output(self, payload:dict) -> dict:
         message = payload["data"]["message"]
         time = payload["time"]
         output = {
@@ -32,37 +39,49 @@ class OutputHandler:
             "type": "chat_message",
             "time": time,
             "data": {
-                "message": message
-            }
+                "message": message,
+                "channel": payload["data"].get("channel"),
+                "priority": payload["data"].get("priority")
+            },
+            "trace": payload.get("trace")
         }
-        return json.dumps(output)
+        return output
         
-    async def route(self, platform:str, payload:str) -> None:
-        message = [self.twitch_queue.encode("ascii"), payload.encode("ascii")]
+    async def route(self, platform:str, payload:dict) -> None:
         try:
             if platform == "twitch":
+                # stamped only when it is about to go out, so a dropped reply leaves no gap
+                self.sequencer.stamp(payload)
+                message = [self.twitch_queue.encode("ascii"), envelope.encode(payload)]
                 await self.twitch_socket.send_multipart(message)
+                ROUTED.labels(platform).inc()
             else:
                 # this is where another streaming platform output would be
-                pass
+                DROPPED.inc()
         except Exception as e:
+            DROPPED.inc()
             print(e)
 
     async def run(self) -> None:
-        # zmq SUB socket
-        self.sub_socket = self.context.socket(zmq.SUB)
-        self.sub_socket.connect(self.chat_address)
-        self.sub_socket.setsockopt(zmq.SUBSCRIBE, bytes(self.chat_sub_topic, "ascii"))
+        # zmq SUB (or PULL) socket
+        self.sub_socket = transport.subscriber(self.context, self.chat_address, self.chat_sub_topic)
+        gaps = transport.GapDetector("backend")
+
+        # zmq PUB (or PUSH) socket
+        self.twitch_socket = transport.publisher(self.context, self.twitch_address)
+        self.sequencer = transport.Sequencer()
 
-        # zmq PUB socket
-        self.twitch_socket = self.context.socket(zmq.PUB)
-        self.twitch_socket.bind(self.twitch_address)
+        asyncio.create_task(metrics.serve())
 
         while True:
             # receive message from chat output queue
             _, msg = await self.sub_socket.recv_multipart()
-            payload = json.loads(msg)
+            received = tracing.now()
+            RECEIVED.inc()
+            payload = envelope.decode(msg)
+            gaps.check(payload)
 
             platform = payload["data"]["platform"]
             output = self.format_output(payload)
+            tracing.add_span(output["trace"], "chat_output_handler", received)
             await self.route(platform, output)
@@ -0,0 +1,17 @@
+import time
+
+# trace context carried in the envelope as {"id", "command", "spans": [[hop, start, end]]}
+# timestamps are CLOCK_MONOTONIC nanoseconds, shared by every container on the host
+
+def now() -> int:
+    return time.monotonic_ns()
+
+
+def start(message_id:str) -> dict:
+    return {"id": message_id, "command": "", "spans": []}
+
+
+def add_span(trace:dict, hop:str, start:int, end:int=None) -> None:
+    if trace is None:
+        return
+    trace["spans"].append([hop, start, end if end is not None else now()])
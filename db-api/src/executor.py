@@ -0,0 +1,37 @@
+import asyncio
+import metrics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from models import database, DB_THREADS
+
+# peewee is synchronous, so queries run on a bounded pool of worker threads
+EXECUTOR = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="db")
+
+QUERY_WAIT = metrics.histogram("db_query_wait_seconds", "Time queries wait for a db thread")
+QUERY_TIME = metrics.histogram("db_query_seconds", "Time spent running queries, including checkout")
+
+# check a pooled connection out for the duration of one unit of work
+def run_with_connection(queued:float, fn, *args):
+    start = time.monotonic()
+    with database.connection_context():
+        result = fn(*args)
+    return result, start - queued, time.monotonic() - start
+
+
+# run a blocking database call without blocking the event loop
+async def run_query(fn, *args):
+    loop = asyncio.get_running_loop()
+    queued = time.monotonic()
+    result, wait, elapsed = await loop.run_in_executor(
+            EXECUTOR, run_with_connection, queued, fn, *args
+            )
+
+    # observed here so histograms are only touched from the event loop
+    QUERY_WAIT.observe(wait)
+    QUERY_TIME.observe(elapsed)
+    return result
+
+
+def shutdown() -> None:
+    EXECUTOR.shutdown(wait=True)
+    database.close_all()
@@ -1,19 +1,96 @@
+import asyncio
 import uvicorn
+import uuid
+import time
+import executor
+import metrics
+import migrations
+import partitions
+from datetime import datetime
 from models import database, Tokens, TextCommands, ChatMessages
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
+from peewee import DataError, IntegrityError
+from executor import run_query
+from prepared import execute_prepared
+from publisher import Publisher
 
 SUCCESS = {"status": "success"}
 FAILURE = {"status": "failure"}
 PLATFORMS = ["twitch", "youtube"]
 
+# rows per INSERT statement when storing chat batches
+BATCH_SIZE = 500
+
+# seconds between chat partition maintenance runs
+MAINTENANCE_INTERVAL = 6 * 60 * 60
+
 app = FastAPI()
-database.create_tables([Tokens, TextCommands, ChatMessages])
+publisher = Publisher()
+
+REQUEST_TIME = metrics.histogram(
+        "db_api_request_seconds", "Request latency per endpoint", ("endpoint",)
+        )
+
+
+@app.on_event("startup")
+async def startup():
+    await run_query(migrations.migrate)
+    asyncio.create_task(maintain_partitions())
+
+
+# keep future chat partitions created and old ones dropped
+async def maintain_partitions():
+    while True:
+        try:
+            await run_query(partitions.maintain)
+        except Exception as e:
+            print(e)
+        await asyncio.sleep(MAINTENANCE_INTERVAL)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    executor.shutdown()
+
+
+# record latency per endpoint; routing fills in the endpoint during call_next
+@app.middleware("http")
+async def time_request(request:Request, call_next):
+    start = time.monotonic()
+    response = await call_next(request)
+    endpoint = request.scope.get("endpoint")
+    if endpoint is not None:
+        REQUEST_TIME.labels(endpoint.__name__).observe(time.monotonic() - start)
+    return response
+
+
+# tell command caches in other services that a text command changed
+async def publish_command_update(action:str, platform:str, command:str) -> None:
+    event = {
+        "id": str(uuid.uuid4()),
+        "source": "db.api",
+        "specversion": "1.0",
+        "type": "command_update",
+        "time": str(datetime.now()),
+        "data": {
+            "action": action,
+            "platform": platform,
+            "command": command
+        }
+    }
+    await publisher.publish(event)
+
 
 @app.get("/")
 async def main():
     return "Running!"
 
 
+@app.get("/metrics")
+async def get_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.post("/commands/add/{platform}/")
 async def add_command(platform:str, payload:Request):
     data = await payload.json()
@@ -24,8 +101,8 @@ async def add_command(platform:str, payload:Request):
         # add to all platforms
         if platform == "all":
             entries = []
-            for platform in PLATFORMS:
-                entry = {"command":command, "output":output, "platform":platform}
+            for p in PLATFORMS:
+                entry = {"command":command, "output":output, "platform":p}
                 entries.append(entry)
 
             statement = TextCommands.insert_many(entries)
@@ -37,7 +114,8 @@ async def add_command(platform:str, payload:Request):
                     output=output,
                     platform=platform
                 )
-        statement.execute()
+        await run_query(statement.execute)
+        await publish_command_update("add", platform, command)
         return SUCCESS
 
     except Exception as e:
@@ -67,7 +145,8 @@ async def edit_command(platform:str, payload:Request):
                             )
                         )
         print(statement)
-        statement.execute()
+        await run_query(statement.execute)
+        await publish_command_update("edit", platform, command)
         return SUCCESS
 
     except Exception as e:
@@ -92,7 +171,8 @@ async def delete_command(platform:str, payload:Request):
                             TextCommands.platform == platform
                             )
                         )
-        statement.execute()
+        await run_query(statement.execute)
+        await publish_command_update("delete", platform, command)
         return SUCCESS
 
     except Exception as e:
@@ -103,11 +183,25 @@ async def delete_command(platform:str, payload:Request):
 @app.get("/commands/get-all/{platform}/")
 async def get_commands(platform:str):
     try:
-        result = (TextCommands
-                .select()
-                .where(TextCommands.platform == platform)
-                ).execute()
-        commands = [c.command for c in result]
+        rows = await run_query(execute_prepared, "get_commands", platform)
+        commands = [r[0] for r in rows]
+        return commands
+
+    except Exception as e:
+        print(e)
+        return FAILURE
+
+
+# full command entries, used to fill the chat handlers' command caches
+@app.get("/commands/dump/{platform}/")
+async def dump_commands(platform:str):
+    try:
+        query = TextCommands.select().where(TextCommands.platform == platform)
+        result = await run_query(list, query)
+        commands = [
+            {"command": c.command, "output": c.output, "help_output": c.help_output}
+            for c in result
+        ]
         return commands
 
     except Exception as e:
@@ -118,11 +212,10 @@ async def get_commands(platform:str):
 @app.get("/commands/output/{platform}/{command}/")
 async def get_command_output(platform:str, command:str) -> dict:
     try:
-        output = TextCommands.get(
-                TextCommands.platform == platform,
-                TextCommands.command == command
-                ).output
-        response = {"output": output}
+        rows = await run_query(execute_prepared, "get_command_output", platform, command)
+        if not rows:
+            return FAILURE
+        response = {"output": rows[0][0]}
         return response
 
     except Exception as e:
@@ -133,11 +226,10 @@ async def get_command_output(platform:str, command:str) -> dict:
 @app.get("/commands/help/{platform}/{command}")
 async def get_command_help(platform:str, command:str) -> dict:
     try:
-        output = TextCommands.get(
-                TextCommands.platform == platform,
-                TextCommands.command == command
-                ).help_output
-        response = {"output": output}
+        rows = await run_query(execute_prepared, "get_command_help", platform, command)
+        if not rows:
+            return FAILURE
+        response = {"output": rows[0][0]}
         return response
 
     except Exception as e:
@@ -154,7 +246,11 @@ async def edit_command_help(platform:str, command:str, payload:Request):
                     .update({TextCommands.help_output: help_output})
                     .where(TextCommands.command == command)
                     )
-        statement.execute()
+        await run_query(statement.execute)
+
+        # help entries are edited across every platform
+        await publish_command_update("edit_help", "all", command)
+        return SUCCESS
 
     except Exception as e:
         print(e)
@@ -174,7 +270,7 @@ async def set_token(payload:Request):
                 preserve = Tokens.token
                 )
             )
-    statement.execute()
+    await run_query(statement.execute)
     return f"Token {name} set!"
 
 
@@ -182,28 +278,61 @@ async def set_token(payload:Request):
 async def get_token(payload:Request):
     data = await payload.json()
     name = data.get("name", "")
-    token = Tokens.select().where(Tokens.name == name).get()
+    query = Tokens.select().where(Tokens.name == name)
+    token = await run_query(query.get)
     return token
 
 
 # time, username, user_id, message, platform
+def chat_message_row(data:dict) -> dict:
+    return {
+        "time": data["time"],
+        "username": data["data"]["username"],
+        "user_id": data["data"]["user_id"],
+        "message": data["data"]["message"],
+        "platform": data["data"]["platform"]
+    }
+
+
 @app.post("/chat/store/")
 async def store_chat_message(payload:Request):
     data = await payload.json()
-    dt = data["time"] 
-    username = data["data"]["username"]
-    user_id = data["data"]["user_id"]
-    message = data["data"]["message"]
-    platform = data["data"]["platform"]
-    
-    statement = ChatMessages.insert(
-            time = dt,
-            username = username,
-            user_id = user_id, 
-            message = message,
-            platform = platform
-        )
-    statement.execute()
+    statement = ChatMessages.insert(**chat_message_row(data))
+    await run_query(statement.execute)
+
+
+# store a list of chat messages in a single transaction
+def insert_chat_rows(rows:list) -> None:
+    with database.atomic():
+        for i in range(0, len(rows), BATCH_SIZE):
+            ChatMessages.insert_many(rows[i:i + BATCH_SIZE]).execute()
+
+
+# 422 when the batch itself is bad, so the sender drops it; 503 when the database is,
+# so the sender keeps it and retries
+@app.post("/chat/store/batch/")
+async def store_chat_messages(payload:Request, response:Response):
+    try:
+        data = await payload.json()
+        rows = [chat_message_row(m) for m in data]
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"Malformed chat batch: {e!r}")
+        response.status_code = 422
+        return FAILURE
+
+    try:
+        await run_query(insert_chat_rows, rows)
+        return SUCCESS
+
+    except (IntegrityError, DataError) as e:
+        print(e)
+        response.status_code = 422
+        return FAILURE
+
+    except Exception as e:
+        print(e)
+        response.status_code = 503
+        return FAILURE
 
 
 # remove all user's messages from DB by user_id
@@ -212,7 +341,7 @@ async def forget_user(payload:Request):
     data = await payload.json()
     user_id = data["user_id"]
     statement = ChatMessages.delete().where(ChatMessages.user_id == user_id)
-    statement.execute()
+    await run_query(statement.execute)
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=1337)
@@ -0,0 +1,126 @@
+import partitions
+from datetime import datetime
+from models import database, BaseModel
+from peewee import IntegerField, CharField, DateTimeField
+
+# arbitrary key for the advisory lock held while migrating
+MIGRATION_LOCK = 7231
+
+class SchemaMigrations(BaseModel):
+    version = IntegerField(primary_key=True)
+    name = CharField()
+    applied = DateTimeField(default=datetime.now)
+    class Meta:
+        table_name = "schema_migrations"
+
+
+# the tables as the models first defined them; pinned so later model changes don't leak in
+def create_tables() -> None:
+    database.execute_sql("""
+        CREATE TABLE IF NOT EXISTS tokens (
+            id SERIAL NOT NULL PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            token VARCHAR(255) NOT NULL
+        )
+    """)
+    database.execute_sql("CREATE UNIQUE INDEX IF NOT EXISTS tokens_name ON tokens (name)")
+    database.execute_sql("""
+        CREATE TABLE IF NOT EXISTS text_commands (
+            id SERIAL NOT NULL PRIMARY KEY,
+            command VARCHAR(255) NOT NULL,
+            platform VARCHAR(255) NOT NULL,
+            output VARCHAR(255) NOT NULL,
+            help_output VARCHAR(255) NOT NULL
+        )
+    """)
+    database.execute_sql("""
+        CREATE TABLE IF NOT EXISTS chat_messages (
+            id SERIAL NOT NULL PRIMARY KEY,
+            time TIMESTAMP NOT NULL,
+            username VARCHAR(255) NOT NULL,
+            user_id VARCHAR(255) NOT NULL,
+            message VARCHAR(255) NOT NULL,
+            platform VARCHAR(255) NOT NULL
+        )
+    """)
+
+
+def unique_text_commands() -> None:
+    # keep only the newest entry of any duplicated command before adding the constraint
+    database.execute_sql("""
+        DELETE FROM text_commands a USING text_commands b
+        WHERE a.platform = b.platform AND a.command = b.command AND a.id < b.id
+    """)
+    database.execute_sql("""
+        ALTER TABLE text_commands
+        ADD CONSTRAINT text_commands_platform_command UNIQUE (platform, command)
+    """)
+
+
+def index_chat_messages_user() -> None:
+    database.execute_sql("""
+        CREATE INDEX IF NOT EXISTS chat_messages_user_id ON chat_messages (user_id)
+    """)
+
+
+# move chat_messages to a table range partitioned by month, keeping ids and rows
+def partition_chat_messages() -> None:
+    database.execute_sql("ALTER TABLE chat_messages RENAME TO chat_messages_legacy")
+    database.execute_sql("""
+        ALTER TABLE chat_messages_legacy
+        RENAME CONSTRAINT chat_messages_pkey TO chat_messages_legacy_pkey
+    """)
+    database.execute_sql("ALTER INDEX chat_messages_user_id RENAME TO chat_messages_legacy_user_id")
+
+    # the partition key has to be part of the primary key; message widens from the
+    # original VARCHAR(255) to TEXT here, the rows are copied over below
+    database.execute_sql("""
+        CREATE TABLE chat_messages (
+            id INTEGER NOT NULL DEFAULT nextval('chat_messages_id_seq'),
+            time TIMESTAMP NOT NULL,
+            username VARCHAR(255) NOT NULL,
+            user_id VARCHAR(255) NOT NULL,
+            message TEXT NOT NULL,
+            platform VARCHAR(255) NOT NULL,
+            PRIMARY KEY (id, time)
+        ) PARTITION BY RANGE (time)
+    """)
+    database.execute_sql("CREATE INDEX chat_messages_user_id ON chat_messages (user_id)")
+
+    oldest = database.execute_sql("SELECT min(time) FROM chat_messages_legacy").fetchone()[0]
+    partitions.ensure_partitions(oldest.date() if oldest else None)
+
+    database.execute_sql("""
+        INSERT INTO chat_messages (id, time, username, user_id, message, platform)
+        SELECT id, time, username, user_id, message, platform FROM chat_messages_legacy
+    """)
+    database.execute_sql("ALTER SEQUENCE chat_messages_id_seq OWNED BY chat_messages.id")
+    database.execute_sql("DROP TABLE chat_messages_legacy")
+
+
+# append new migrations here; never edit or reorder ones that have shipped
+MIGRATIONS = [
+    (1, "create tables", create_tables),
+    (2, "unique text command per platform", unique_text_commands),
+    (3, "index chat messages by user id", index_chat_messages_user),
+    (4, "partition chat messages by month", partition_chat_messages),
+    (5, "default chat partition", partitions.create_default_partition),
+]
+
+# apply every migration that hasn't run yet, each in its own transaction
+def migrate() -> None:
+    database.execute_sql("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK,))
+    try:
+        database.create_tables([SchemaMigrations])
+        applied = {m.version for m in SchemaMigrations.select()}
+
+        for version, name, migration in MIGRATIONS:
+            if version in applied:
+                continue
+            with database.atomic():
+                migration()
+                SchemaMigrations.create(version=version, name=name)
+            print(f"Applied migration {version}: {name}")
+
+    finally:
+        database.execute_sql("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK,))
@@ -1,6 +1,7 @@
 import os
 from datetime import datetime
-from peewee import PostgresqlDatabase
+from playhouse.pool import PooledPostgresqlDatabase
+from psycopg2.extensions import connection as PgConnection
 from peewee import Model 
 from peewee import TextField
 from peewee import DateTimeField
@@ -13,8 +14,23 @@ DB_NAME = os.environ["DB_NAME"]
 HOST = os.environ["DATABASE"]
 PORT = os.environ["PSQL_PORT"]
 
-database = PostgresqlDatabase(DB_NAME, user=DB_USER, password=DB_PASS, port=PORT, 
-                              host=HOST, autorollback=True)
+# query threads, and pool limits; idle connections older than the stale timeout are recycled
+DB_THREADS = int(os.environ.get("DB_THREADS", 16))
+DB_MAX_CONNECTIONS = int(os.environ.get("DB_MAX_CONNECTIONS", DB_THREADS))
+DB_STALE_TIMEOUT = int(os.environ.get("DB_STALE_TIMEOUT", 300))
+
+# remembers which server-side prepared statements exist on this connection
+class PreparingConnection(PgConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+database = PooledPostgresqlDatabase(DB_NAME, user=DB_USER, password=DB_PASS, port=PORT, 
+                                    host=HOST, autorollback=True,
+                                    max_connections=DB_MAX_CONNECTIONS,
+                                    stale_timeout=DB_STALE_TIMEOUT,
+                                    connection_factory=PreparingConnection)
 
 class BaseModel(Model):
     class Meta:
@@ -26,6 +42,7 @@ class Tokens(BaseModel):
     token = CharField()
 
 
+# indexes and constraints beyond the initial tables live in migrations.py
 class TextCommands(BaseModel):
     command = CharField()
     platform = CharField()
@@ -35,11 +52,12 @@ class TextCommands(BaseModel):
         table_name = "text_commands"
 
 
+# partitioned by month on time, see migrations.py and partitions.py
 class ChatMessages(BaseModel):
     time = DateTimeField()
     username = CharField()
     user_id = CharField()
-    message = CharField()
+    message = TextField()
     platform = CharField()
     class Meta:
         table_name = "chat_messages"
@@ -0,0 +1,130 @@
+import gzip
+import os
+import re
+from datetime import date
+from models import database
+
+# months of chat history to keep; 0 keeps everything
+RETENTION_MONTHS = int(os.environ.get("CHAT_RETENTION_MONTHS", 0))
+
+# how many months of future partitions to keep created
+PARTITIONS_AHEAD = int(os.environ.get("CHAT_PARTITIONS_AHEAD", 3))
+
+# when set, dropped partitions are first exported here as gzipped csv
+ARCHIVE_DIR = os.environ.get("CHAT_ARCHIVE_DIR", "")
+
+PARTITION_NAME = re.compile(r"^chat_messages_(\d{4})_(\d{2})$")
+
+def month_start(d:date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def add_months(d:date, months:int) -> date:
+    index = d.year * 12 + d.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month:date) -> str:
+    return f"chat_messages_{month:%Y_%m}"
+
+
+# catches rows outside every monthly partition, so an insert never fails for want of one
+DEFAULT_PARTITION = "chat_messages_default"
+
+def create_default_partition() -> None:
+    database.execute_sql(f"""
+        CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF chat_messages DEFAULT
+    """)
+
+
+def create_partition(month:date) -> None:
+    name = partition_name(month)
+    start, end = month, add_months(month, 1)
+    attached = attached_partitions()
+    if name in attached:
+        return
+
+    # postgres won't add a partition whose range already has rows in the default one,
+    # so move those rows into the new partition while the default is detached
+    stray = DEFAULT_PARTITION in attached and database.execute_sql(f"""
+        SELECT 1 FROM {DEFAULT_PARTITION} WHERE time >= %s AND time < %s LIMIT 1
+    """, (start, end)).fetchone()
+    with database.atomic():
+        if stray:
+            database.execute_sql(f"ALTER TABLE chat_messages DETACH PARTITION {DEFAULT_PARTITION}")
+        database.execute_sql(f"""
+            CREATE TABLE {name}
+            PARTITION OF chat_messages
+            FOR VALUES FROM ('{start}') TO ('{end}')
+        """)
+        if stray:
+            database.execute_sql(f"""
+                WITH moved AS (
+                    DELETE FROM {DEFAULT_PARTITION} WHERE time >= %s AND time < %s RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved
+            """, (start, end))
+            database.execute_sql(f"""
+                ALTER TABLE chat_messages ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT
+            """)
+            print(f"Moved stray chat rows into {name}")
+
+
+# create partitions from the given month through PARTITIONS_AHEAD months from now
+def ensure_partitions(first:date=None) -> None:
+    current = month_start(date.today())
+    month = month_start(first) if first else current
+    last = add_months(current, PARTITIONS_AHEAD)
+    while month <= last:
+        create_partition(month)
+        month = add_months(month, 1)
+
+
+# every table attached to chat_messages, default partition included
+def attached_partitions() -> set:
+    cursor = database.execute_sql("""
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = 'chat_messages'
+    """)
+    return {name for (name,) in cursor.fetchall()}
+
+
+# month of every attached monthly partition, keyed by table name
+def list_partitions() -> dict:
+    partitions = {}
+    for name in attached_partitions():
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions[name] = date(int(match[1]), int(match[2]), 1)
+    return partitions
+
+
+def archive_partition(name:str) -> None:
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = os.path.join(ARCHIVE_DIR, f"{name}.csv.gz")
+    cursor = database.connection().cursor()
+    with gzip.open(path, "wt") as f:
+        cursor.copy_expert(f"COPY {name} TO STDOUT WITH CSV HEADER", f)
+    print(f"Archived {name} to {path}")
+
+
+# drop whole partitions past the retention window instead of deleting rows
+def apply_retention() -> None:
+    cutoff = add_months(month_start(date.today()), -RETENTION_MONTHS)
+    for name, month in sorted(list_partitions().items()):
+        if month >= cutoff:
+            continue
+        with database.atomic():
+            database.execute_sql(f"ALTER TABLE chat_messages DETACH PARTITION {name}")
+            if ARCHIVE_DIR:
+                archive_partition(name)
+            database.execute_sql(f"DROP TABLE {name}")
+        print(f"Dropped chat partition {name}")
+
+
+def maintain() -> None:
+    ensure_partitions()
+    if RETENTION_MONTHS > 0:
+        apply_retention()
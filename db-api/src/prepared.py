@@ -0,0 +1,25 @@
+from models import database
+
+# hot lookups, run as server-side prepared statements
+STATEMENTS = {
+    "get_commands": "SELECT command FROM text_commands WHERE platform = $1",
+    "get_command_output": """
+        SELECT output FROM text_commands WHERE platform = $1 AND command = $2
+    """,
+    "get_command_help": """
+        SELECT help_output FROM text_commands WHERE platform = $1 AND command = $2
+    """,
+}
+
+# must run with a connection checked out, i.e. through executor.run_query
+def execute_prepared(name:str, *params) -> list:
+    conn = database.connection()
+
+    # statements are prepared once per pooled connection
+    if name not in conn.prepared:
+        database.execute_sql(f"PREPARE {name} AS {STATEMENTS[name]}")
+        conn.prepared.add(name)
+
+    placeholders = ", ".join(["%s"] * len(params))
+    cursor = database.execute_sql(f"EXECUTE {name}({placeholders})", params)
+    return cursor.fetchall()
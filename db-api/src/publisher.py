@@ -0,0 +1,25 @@
+import os
+import zmq
+import envelope
+import transport
+from zmq.asyncio import Context
+
+CONTEXT = Context()
+PORT = os.environ["ZMQ_PORT"]
+HOST = "0.0.0.0"
+PROTOCOL = "tcp"
+ZMQ_ADDRESS = f"{PROTOCOL}://{HOST}:{PORT}"
+COMMANDS_TOPIC = os.environ["COMMANDS_TOPIC"]
+
+class Publisher:
+    def __init__(self, topic:str=COMMANDS_TOPIC, context:Context=CONTEXT):
+        self.topic = topic
+        self.context = context
+        # every chat handler needs every update, so this link is always PUB/SUB
+        self.socket = transport.publisher(self.context, ZMQ_ADDRESS, mode="pubsub")
+        self.sequencer = transport.Sequencer()
+
+    async def publish(self, payload:dict) -> None:
+        self.sequencer.stamp(payload)
+        message = [self.topic.encode("ascii"), envelope.encode(payload)]
+        await self.socket.send_multipart(message)
@@ -0,0 +1,25 @@
+#!/bin/sh
+# runs the load harness once per chat_input_handler replica count, with sharding on and the
+# stub db, and keeps each report; run from the repository root:
+# sh load-harness/scale.sh [replica counts, default "1 2 4"]
+set -e
+
+COUNTS=${*:-1 2 4}
+COMPOSE="docker-compose -f docker-compose.yml -f load-harness/docker-compose.yml -f load-harness/docker-compose.stubdb.yml"
+REPORTS=load-harness/reports
+
+for n in $COUNTS; do
+    echo "== chat_input_handler x$n"
+    rm -f $REPORTS/report.json
+    CHAT_SHARDING=1 $COMPOSE up --build --scale chat_input_handler=$n \
+        --abort-on-container-exit --exit-code-from fake_twitch
+    $COMPOSE down
+    cp $REPORTS/report.json $REPORTS/scale-$n.json
+done
+
+# side by side, so the scaling (or lack of it) is visible at a glance
+for n in $COUNTS; do
+    python3 -c "import json, sys; r = json.load(open(sys.argv[1])); \
+print(sys.argv[2], 'stored/s', r['stored_lines_per_s'], 'answered/s', r['answered_probes_per_s'], \
+'p99 ms', r['reply_latency_ms']['p99'])" $REPORTS/scale-$n.json "x$n"
+done
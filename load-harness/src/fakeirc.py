@@ -0,0 +1,125 @@
+import asyncio
+import time
+
+HOST = "tmi.twitch.tv"
+
+# seconds between server PINGs, like Twitch's keepalive
+PING_INTERVAL = 60
+
+class Client:
+    def __init__(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.nick = ""
+        self.channels = set()
+        self.tags = False
+
+
+    def send(self, line:str) -> None:
+        self.writer.write(f"{line}\r\n".encode())
+
+
+class FakeTwitchServer:
+    # on_reply is called with (channel, text, monotonic time) for every PRIVMSG a client sends
+    def __init__(self, on_reply=None):
+        self.on_reply = on_reply
+        self.clients = set()
+        # set once a client has joined a channel with tags enabled
+        self.ready = asyncio.Event()
+        self.pongs = 0
+
+
+    async def serve(self, host:str, port:int) -> None:
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Fake Twitch IRC listening on {host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+    async def handle(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter) -> None:
+        client = Client(reader, writer)
+        self.clients.add(client)
+        keepalive = asyncio.create_task(self.keepalive(client))
+        try:
+            while True:
+                data = await reader.readuntil(b"\r\n")
+                self.command(client, data[:-2].decode(errors="replace"))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            keepalive.cancel()
+            self.clients.discard(client)
+            writer.close()
+
+
+    # just enough of Twitch's IRC dialect for the bot's login, join and replies
+    def command(self, client:Client, line:str) -> None:
+        verb, _, rest = line.partition(" ")
+        if verb == "PASS":
+            pass
+
+        elif verb == "NICK":
+            client.nick = rest.strip().lower()
+            for code, text in (("001", "Welcome, GLHF!"), ("002", f"Your host is {HOST}"),
+                               ("003", "This server is rather new"), ("004", "-"),
+                               ("375", "-"), ("372", "You are in a maze of twisty passages."),
+                               ("376", ">")):
+                client.send(f":{HOST} {code} {client.nick} :{text}")
+
+        elif verb == "CAP":
+            capabilities = rest.partition(":")[2]
+            client.tags = "twitch.tv/tags" in capabilities
+            client.send(f":{HOST} CAP * ACK :{capabilities}")
+            self.check_ready(client)
+
+        elif verb == "JOIN":
+            for channel in rest.strip().split(","):
+                channel = channel.lstrip("#").lower()
+                client.channels.add(channel)
+                user = f"{client.nick}!{client.nick}@{client.nick}.{HOST}"
+                client.send(f":{user} JOIN #{channel}")
+                client.send(f":{client.nick}.{HOST} 353 {client.nick} = #{channel} :{client.nick}")
+                client.send(f":{client.nick}.{HOST} 366 {client.nick} #{channel} :End of /NAMES list")
+            self.check_ready(client)
+
+        elif verb == "PART":
+            for channel in rest.strip().split(","):
+                client.channels.discard(channel.lstrip("#").lower())
+
+        elif verb == "PING":
+            client.send(f"PONG :{HOST}")
+
+        elif verb == "PONG":
+            self.pongs += 1
+
+        elif verb == "PRIVMSG":
+            target, _, text = rest.partition(" :")
+            if self.on_reply:
+                self.on_reply(target.lstrip("#"), text, time.monotonic())
+
+
+    def check_ready(self, client:Client) -> None:
+        if client.tags and client.channels:
+            self.ready.set()
+
+
+    async def keepalive(self, client:Client) -> None:
+        while True:
+            await asyncio.sleep(PING_INTERVAL)
+            client.send(f"PING :{HOST}")
+
+
+    # queue a chat line for every client in the channel; flushed by drain()
+    def broadcast(self, channel:str, line:str) -> None:
+        untagged = line.split(" ", 1)[1] if line.startswith("@") else line
+        for client in self.clients:
+            if channel in client.channels:
+                client.send(line if client.tags else untagged)
+
+
+    async def drain(self) -> None:
+        for client in list(self.clients):
+            try:
+                await client.writer.drain()
+            except ConnectionError:
+                self.clients.discard(client)
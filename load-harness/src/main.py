@@ -0,0 +1,204 @@
+import aiohttp
+import asyncio
+import json
+import os
+import re
+import time
+from fakeirc import FakeTwitchServer
+from traffic import PROBE_PREFIX, ReplayChat, SyntheticChat
+
+IRC_PORT = int(os.environ["IRC_PORT"])
+CHANNEL = os.environ.get("CHANNEL", "loadtest").strip('"').lower()
+COMMAND_TRIGGER = os.environ["COMMAND_TRIGGER"]
+
+# chat lines per second, for how long, and how long to wait for late replies afterwards
+LOAD_RATE = float(os.environ.get("LOAD_RATE", 200))
+LOAD_DURATION = float(os.environ.get("LOAD_DURATION", 60))
+LOAD_SETTLE = float(os.environ.get("LOAD_SETTLE", 15))
+
+# weights of plain chat, correlated probes and other commands in synthetic traffic
+LOAD_MIX = os.environ.get("LOAD_MIX", "chat:80,probe:10,commands:5,joke:5")
+LOAD_USERS = int(os.environ.get("LOAD_USERS", 1000))
+
+# raw IRC lines to replay instead of synthetic chat; probes are then sent alongside
+LOAD_REPLAY_FILE = os.environ.get("LOAD_REPLAY_FILE", "")
+REPLAY_PROBE_EVERY = 10
+
+LOAD_REPORT_FILE = os.environ.get("LOAD_REPORT_FILE", "")
+
+# the stub db api counts stored chat lines; the real one has no /stats/ route
+DB_API = os.environ["DB_API"]
+DB_API_PORT = os.environ["DB_API_PORT"]
+STATS_URL = f"http://{DB_API}:{DB_API_PORT}/stats/"
+
+# seconds between sends; lines due in between go out together
+TICK = 0.01
+
+# seconds between reads of the stub db api's stored count
+STATS_INTERVAL = 1
+
+PROBE_NAME = re.compile(rf"\b{PROBE_PREFIX}\d+\b", re.IGNORECASE)
+
+# units per second between start and the last time the count grew
+def rate(count:int, start:float, last:float) -> float:
+    if not count or last is None or last <= start:
+        return None
+    return count / (last - start)
+
+
+def percentile(values:list, p:float) -> float:
+    if not values:
+        return None
+    rank = max(0, min(len(values) - 1, round(p / 100 * len(values)) - 1))
+    return values[rank]
+
+
+class LoadRun:
+    def __init__(self):
+        self.server = FakeTwitchServer(self.on_reply)
+        self.synthetic = SyntheticChat(CHANNEL, COMMAND_TRIGGER, LOAD_MIX, LOAD_USERS)
+        self.replay = ReplayChat(CHANNEL, LOAD_REPLAY_FILE) if LOAD_REPLAY_FILE else None
+
+        self.sent = 0
+        self.pending = {}
+        self.latencies = []
+        self.other_replies = 0
+
+        # when sending began, when the last probe was answered and when storage last grew
+        self.started = None
+        self.last_answer = None
+        self.stored_at_start = None
+        self.last_stored = None
+        self.last_stored_at = None
+
+
+    def on_reply(self, channel:str, text:str, received:float) -> None:
+        match = PROBE_NAME.search(text)
+        sent = self.pending.pop(match.group().lower(), None) if match else None
+        if sent is None:
+            self.other_replies += 1
+        else:
+            self.latencies.append(received - sent)
+            self.last_answer = received
+
+
+    def next_line(self) -> tuple:
+        if self.replay is None:
+            return self.synthetic.line()
+        if self.sent % REPLAY_PROBE_EVERY == 0:
+            while True:
+                line, probe = self.synthetic.line()
+                if probe:
+                    return line, probe
+        return self.replay.line()
+
+
+    async def send_load(self) -> float:
+        start = self.started = time.monotonic()
+        end = start + LOAD_DURATION
+        while True:
+            now = time.monotonic()
+            if now >= end:
+                break
+            due = int((now - start) * LOAD_RATE)
+            while self.sent < due:
+                line, probe = self.next_line()
+                if probe:
+                    self.pending[probe] = time.monotonic()
+                self.server.broadcast(CHANNEL, line)
+                self.sent += 1
+            await self.server.drain()
+            await asyncio.sleep(TICK)
+        return time.monotonic() - start
+
+
+    async def stored(self) -> int:
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(STATS_URL) as r:
+                    return (await r.json())["stored"]
+        except Exception as e:
+            print(f"No storage stats from {STATS_URL}: {e}")
+            return None
+
+
+    # follow the stored count so storage throughput is measured where rows land
+    async def watch_storage(self) -> None:
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            stored = await self.stored()
+            if stored is None:
+                return
+            if stored > self.last_stored:
+                self.last_stored = stored
+                self.last_stored_at = time.monotonic()
+
+
+    def report(self, elapsed:float, stored:int) -> dict:
+        latencies = sorted(l * 1000 for l in self.latencies)
+        probes = self.synthetic.probes
+        answered = len(latencies)
+        stored_during_run = None
+        if stored is not None and self.stored_at_start is not None:
+            stored_during_run = stored - self.stored_at_start
+        return {
+            "rate_target": LOAD_RATE,
+            "duration_s": elapsed,
+            "lines_sent": self.sent,
+            "offered_lines_per_s": self.sent / elapsed if elapsed else 0.0,
+
+            # achieved end to end: what came out of the pipeline, not what went in
+            "stored_lines_per_s": rate(stored_during_run, self.started, self.last_stored_at),
+            "answered_probes_per_s": rate(answered, self.started, self.last_answer),
+            "probes_sent": probes,
+            "probes_answered": answered,
+            "probe_loss": (probes - answered) / probes if probes else 0.0,
+            "other_replies": self.other_replies,
+            "reply_latency_ms": {
+                "p50": percentile(latencies, 50),
+                "p90": percentile(latencies, 90),
+                "p99": percentile(latencies, 99),
+                "max": latencies[-1] if latencies else None,
+                "mean": sum(latencies) / answered if answered else None
+            },
+            "lines_stored": stored_during_run,
+            "storage_loss": ((self.sent - stored_during_run) / self.sent
+                             if stored_during_run is not None and self.sent else None)
+        }
+
+
+    async def run(self) -> dict:
+        asyncio.create_task(self.server.serve("0.0.0.0", IRC_PORT))
+        print("Waiting for the bot to join...")
+        await self.server.ready.wait()
+
+        # the count before any load, so earlier runs aren't counted; no stats, no watching
+        self.stored_at_start = self.last_stored = await self.stored()
+        watcher = None
+        if self.stored_at_start is not None:
+            watcher = asyncio.create_task(self.watch_storage())
+
+        print(f"Sending {LOAD_RATE:g} lines/s for {LOAD_DURATION:g}s")
+        elapsed = await self.send_load()
+
+        # give replies and buffered chat time to make it through the pipeline
+        await asyncio.sleep(LOAD_SETTLE)
+        if watcher:
+            watcher.cancel()
+        stored = await self.stored()
+        if stored is not None and self.last_stored is not None and stored > self.last_stored:
+            self.last_stored, self.last_stored_at = stored, time.monotonic()
+        return self.report(elapsed, stored)
+
+
+async def main():
+    report = await LoadRun().run()
+    output = json.dumps(report, indent=2)
+    print(output)
+    if LOAD_REPORT_FILE:
+        with open(LOAD_REPORT_FILE, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+import os
+from aiohttp import web
+
+DB_API_PORT = int(os.environ["DB_API_PORT"])
+
+SUCCESS = {"status": "success"}
+
+# a couple of text commands so the chat handlers' command caches have something to serve
+TEXT_COMMANDS = [
+    {"command": "discord", "output": "Join the Discord!", "help_output": "Links the Discord."},
+    {"command": "github", "output": "The code is on GitHub!", "help_output": "Links the repo."}
+]
+
+# stands in for db-api during load runs: answers every route and only counts what it's sent
+class StubDatabase:
+    def __init__(self):
+        self.stored = 0
+
+
+    async def running(self, request:web.Request) -> web.Response:
+        return web.json_response("Running!")
+
+
+    async def dump_commands(self, request:web.Request) -> web.Response:
+        return web.json_response(TEXT_COMMANDS)
+
+
+    async def get_commands(self, request:web.Request) -> web.Response:
+        return web.json_response([c["command"] for c in TEXT_COMMANDS])
+
+
+    async def store(self, request:web.Request) -> web.Response:
+        await request.read()
+        self.stored += 1
+        return web.json_response(SUCCESS)
+
+
+    async def store_batch(self, request:web.Request) -> web.Response:
+        self.stored += len(await request.json())
+        return web.json_response(SUCCESS)
+
+
+    async def success(self, request:web.Request) -> web.Response:
+        await request.read()
+        return web.json_response(SUCCESS)
+
+
+    async def stats(self, request:web.Request) -> web.Response:
+        return web.json_response({"stored": self.stored})
+
+
+def main():
+    db = StubDatabase()
+    app = web.Application()
+    app.add_routes([
+        web.get("/", db.running),
+        web.get("/commands/dump/{platform}/", db.dump_commands),
+        web.get("/commands/get-all/{platform}/", db.get_commands),
+        web.post("/chat/store/", db.store),
+        web.post("/chat/store/batch/", db.store_batch),
+        web.get("/stats/", db.stats),
+        web.post("/{tail:.*}", db.success)
+    ])
+    web.run_app(app, port=DB_API_PORT)
+
+
+if __name__ == "__main__":
+    main()
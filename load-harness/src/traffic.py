@@ -0,0 +1,95 @@
+import random
+import time
+import uuid
+
+# probes ask for help on a command that doesn't exist; the reply names the sender
+PROBE_PREFIX = "probe"
+MISSING_COMMAND = "loadharnessnosuchcommand"
+
+CHAT_WORDS = (
+    "hello", "lol", "nice", "pog", "gg", "what", "is", "this", "code", "stream",
+    "python", "docker", "zmq", "bug", "ship", "it", "chat", "hype", "wow", "test"
+)
+
+# "chat:80,probe:10,commands:5,joke:5" -> [("chat", 80.0), ...]
+def parse_mix(mix:str) -> list:
+    entries = []
+    for entry in mix.split(","):
+        name, _, weight = entry.strip().partition(":")
+        entries.append((name, float(weight or 1)))
+    return entries
+
+
+def privmsg(channel:str, user_id:str, name:str, text:str, badges:str="", color:str="#1E90FF") -> str:
+    tags = ";".join((
+        "badge-info=",
+        f"badges={badges}",
+        f"color={color}",
+        f"display-name={name}",
+        "emotes=",
+        "flags=",
+        f"id={uuid.uuid4()}",
+        f"mod={int('moderator' in badges)}",
+        "room-id=1",
+        "subscriber=0",
+        f"tmi-sent-ts={int(time.time() * 1000)}",
+        "turbo=0",
+        f"user-id={user_id}",
+        "user-type="
+    ))
+    login = name.lower()
+    return f"@{tags} :{login}!{login}@{login}.tmi.twitch.tv PRIVMSG #{channel} :{text}"
+
+
+class SyntheticChat:
+    # generated lines are (line, probe name or None)
+    def __init__(self, channel:str, trigger:str, mix:str, users:int, seed:int=None):
+        self.channel = channel
+        self.trigger = trigger
+        self.kinds, self.weights = zip(*parse_mix(mix))
+        self.users = users
+        self.random = random.Random(seed)
+        self.probes = 0
+
+
+    def chatter(self) -> tuple:
+        n = self.random.randrange(self.users)
+        return str(100000 + n), f"viewer{n}"
+
+
+    def line(self) -> tuple:
+        kind = self.random.choices(self.kinds, self.weights)[0]
+
+        # every probe comes from a new user so cooldowns and reply dedup never hide it
+        if kind == "probe":
+            self.probes += 1
+            name = f"{PROBE_PREFIX}{self.probes}"
+            text = f"{self.trigger}help {self.trigger}{MISSING_COMMAND}"
+            return privmsg(self.channel, str(10**9 + self.probes), name, text), name
+
+        user_id, name = self.chatter()
+        if kind == "chat":
+            words = self.random.choices(CHAT_WORDS, k=self.random.randint(1, 12))
+            text = " ".join(words)
+        else:
+            text = f"{self.trigger}{kind}"
+        return privmsg(self.channel, user_id, name, text), None
+
+
+class ReplayChat:
+    # replays raw IRC lines from a recording, rewritten to the load channel
+    def __init__(self, channel:str, path:str):
+        self.channel = channel
+        with open(path) as f:
+            self.lines = [l.rstrip("\r\n") for l in f if " PRIVMSG #" in l]
+        if not self.lines:
+            raise ValueError(f"No PRIVMSG lines in {path}")
+        self.position = 0
+
+
+    def line(self) -> tuple:
+        line = self.lines[self.position % len(self.lines)]
+        self.position += 1
+        start = line.index(" PRIVMSG #") + len(" PRIVMSG #")
+        end = line.index(" ", start)
+        return line[:start] + self.channel + line[end:], None
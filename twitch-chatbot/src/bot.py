@@ -1,10 +1,18 @@
 import asyncio
-import os
+import envelope
+import ircpool
 import json
+import metrics
+import os
+import ratelimit
 import time
+import tracing
+import transport
 import uuid
 import zmq
+from collector import TraceCollector
 from dataclasses import dataclass
+from hashring import HashRing
 from datetime import datetime
 from dotenv import load_dotenv
 from zmq.asyncio import Context
@@ -12,6 +20,9 @@ from zmq.asyncio import Context
 OAUTH_TOKEN = os.environ["OAUTH_TOKEN"]
 BOT_NAME = os.environ["BOT_NAME"]
 CHANNEL = os.environ["CHANNEL"]
+
+# channels joined at startup; more can be joined or left through the control socket
+CHANNELS = tuple(ircpool.normalize(c) for c in os.environ.get("CHANNELS", CHANNEL).split(",") if c.strip())
 OUTPUT_HANDLER = os.environ["OUTPUT_HANDLER"]
 
 ZMQ_PORT = os.environ["ZMQ_PORT"]
@@ -22,19 +33,91 @@ PUB_ADDRESS = f"tcp://0.0.0.0:{ZMQ_PORT}"
 # zmq SUB address
 SUB_ADDRESS = f"tcp://{OUTPUT_HANDLER}:{ZMQ_PORT}"
 
+# zmq REP address for channel join/part requests
+CONTROL_PORT = os.environ.get("BOT_CONTROL_PORT", 5557)
+CONTROL_ADDRESS = f"tcp://0.0.0.0:{CONTROL_PORT}"
+
+LINES_READ = metrics.counter("twitch_lines_read_total", "IRC lines read from Twitch")
+LINES_PUBLISHED = metrics.counter("twitch_lines_published_total", "IRC lines published to zmq")
+PINGS = metrics.counter("twitch_pings_total", "PINGs answered")
+REPLIES_SENT = metrics.counter("twitch_replies_sent_total", "Chat replies sent to Twitch")
+REPLIES_DEDUPLICATED = metrics.counter("twitch_replies_deduplicated_total", "Identical replies skipped")
+REPLIES_DROPPED = metrics.counter("twitch_replies_dropped_total", "Replies dropped from a full queue")
+REPLIES_UNROUTED = metrics.counter("twitch_replies_unrouted_total", "Replies for channels the bot isn't in")
+CHANNEL_LINES = metrics.counter("twitch_channel_lines_total", "IRC lines read per channel", ("channel",))
+CHANNEL_REPLIES = metrics.counter("twitch_channel_replies_sent_total", "Chat replies sent per channel", ("channel",))
+
+# twitch allows 20 messages per 30 seconds, or 100 if the bot is a mod in the channel
+RATE_LIMIT = int(os.environ.get("TWITCH_RATE_LIMIT", 20))
+RATE_PERIOD = float(os.environ.get("TWITCH_RATE_PERIOD", 30))
+
+# identical replies inside this many seconds are only sent once
+DEDUP_WINDOW = float(os.environ.get("REPLY_DEDUP_SECONDS", 30))
+MAX_QUEUED_REPLIES = int(os.environ.get("MAX_QUEUED_REPLIES", 500))
+
+# irc connections the channels are spread over, and how many channels each may join
+IRC_CONNECTIONS = int(os.environ.get("IRC_CONNECTIONS", 1))
+CHANNELS_PER_CONNECTION = int(os.environ.get("CHANNELS_PER_CONNECTION", 50))
+
+# twitch allows 20 JOINs per 10 seconds per account
+JOIN_LIMIT = int(os.environ.get("TWITCH_JOIN_LIMIT", 20))
+JOIN_PERIOD = float(os.environ.get("TWITCH_JOIN_PERIOD", 10))
+GREETING = "I'm listening!"
+
+# shard chat across chat handler workers by user id instead of broadcasting it
+SHARDED = os.environ.get("CHAT_SHARDING", "0") == "1"
+
+# a line for a worker at its high water mark is dropped, keeping every user's lines on
+# one worker in order; 1 sends it to the next worker instead, trading that order away
+SHARD_OVERFLOW = os.environ.get("CHAT_SHARD_OVERFLOW", "0") == "1"
+
+# workers send a heartbeat this often and are dropped after missing a few
+WORKER_HEARTBEAT = 5
+WORKER_TIMEOUT = 3 * WORKER_HEARTBEAT
+
+SHARD_DROPPED = metrics.counter("twitch_shard_dropped_total", "Lines dropped with no live worker able to take them")
+SHARD_FULL = metrics.counter("twitch_shard_full_total", "Lines dropped by a worker at its high water mark")
+SHARD_RESHARDED = metrics.counter("twitch_shard_resharded_total", "Lines sent past a worker at its high water mark")
+
+# value of the user-id tag in a raw IRC line, without parsing the other tags
+def user_id_of(line:str) -> str:
+    if not line.startswith("@"):
+        return ""
+    tags = line[:line.find(" ")]
+    start = tags.find(";user-id=")
+    if start == -1:
+        if not tags.startswith("@user-id="):
+            return ""
+        start = 0
+    start = tags.index("=", start) + 1
+    end = tags.find(";", start)
+    return tags[start:end] if end != -1 else tags[start:]
+
+
+# channel a raw IRC line was sent to, without parsing the rest of it
+def channel_of(line:str) -> str:
+    start = line.find(" #")
+    if start == -1:
+        return ""
+    start += 2
+    end = line.find(" ", start)
+    return line[start:end] if end != -1 else line[start:]
+
+
 @dataclass
 class Bot:
     oauth_token: str = os.environ["OAUTH_TOKEN"]
     bot_name: str = os.environ["BOT_NAME"]
-    channel: str = CHANNEL
-    server: str = "irc.twitch.tv"
+    channels: tuple = CHANNELS
+    server: str = os.environ.get("IRC_SERVER", "irc.twitch.tv")
     port: int = os.environ["IRC_PORT"]
     topic: str = os.environ["TWITCH_IN_TOPIC"]
     outgoing_topic: str = os.environ["TWITCH_OUT_TOPIC"]
     pub_address: str = PUB_ADDRESS
     sub_address: str = SUB_ADDRESS
+    control_address: str = CONTROL_ADDRESS
 
-    def format_output(self, message:str) -> str:
+    def format_output(self, message:str, channel:str) -> dict:
         id_ = str(uuid.uuid4())
         output = {
             "id": id_,
@@ -45,103 +128,237 @@ class Bot:
             "data": {
                 "platform": "twitch",
                 "machine": "twitch_chat_monitor1",
+                "channel": channel,
                 "message": message
                 }
             }
-        return json.dumps(output)
+        return output
         
 
-    async def publish_to_zmq(self, payload:str) -> None:
-        message = [self.topic.encode("ascii"), payload.encode("ascii")]
+    async def publish_to_zmq(self, payload:dict, user_id:str="") -> None:
+        if SHARDED:
+            await self.dispatch(payload, user_id)
+            return
+
+        self.sequencer.stamp(payload)
+        message = [self.topic.encode("ascii"), envelope.encode(payload)]
         await self.pub.send_multipart(message)
 
 
-    async def send(self, message:str) -> None:
-        self.writer.write(f"{message}\r\n".encode())
-        await self.writer.drain()
+    # send a line to the worker that owns this user, so each user's lines stay in order
+    async def dispatch(self, payload:dict, user_id:str) -> None:
+        busy = set()
+        while True:
+            identity = self.ring.get(user_id.encode(), busy)
+            if identity is None:
+                break
 
+            # each worker gets its own sequence so it can spot its own gaps
+            sequencer = self.shard_sequencers.get(identity)
+            if sequencer is None:
+                sequencer = self.shard_sequencers[identity] = transport.Sequencer()
+            sequencer.stamp(payload)
 
-    async def send_chat_message(self, message:str) -> None:
-        await self.send(f"PRIVMSG #{self.channel} :{message}")
+            message = [identity, self.topic.encode("ascii"), envelope.encode(payload)]
+            try:
+                await self.router.send_multipart(message, zmq.NOBLOCK)
+                return
 
+            # the worker is alive but full; the skipped sequence number shows it the loss
+            except zmq.Again:
+                if not SHARD_OVERFLOW:
+                    SHARD_FULL.inc()
+                    return
 
-    async def pong(self) -> None:
-        await self.send("PONG tmi.twitch.tv")
+                # unless overflowing to the next worker, which then skips nothing
+                sequencer.seq -= 1
+                busy.add(identity)
+                SHARD_RESHARDED.inc()
 
+            # the worker has gone away; rehash onto the remaining ones
+            except zmq.ZMQError as e:
+                print(f"Worker {identity} unreachable: {e}")
+                self.remove_worker(identity)
+        SHARD_DROPPED.inc()
 
-    async def connect(self) -> None:
-        await self.send(f"PASS oauth:{self.oauth_token}")
-        await self.send(f"NICK {self.bot_name}")
-        await self.send(f"JOIN #{self.channel}")        
-        await self.send(f"CAP REQ :twitch.tv/tags")
-        await self.send(f"PRIVMSG #{self.channel} :I'm listening!")
 
+    def remove_worker(self, identity:bytes) -> None:
+        self.ring.remove(identity)
+        self.workers.pop(identity, None)
+        self.shard_sequencers.pop(identity, None)
 
-    async def read_chat(self) -> None:
-        exp = 0
-        connected = False
-        while not connected:
-            try:
-                self.reader, self.writer = await asyncio.open_connection(self.server, self.port)
-                connected = True
-                print("Connected to Twitch IRC")
-
-            # retry connection at increasing intervals
-            except ConnectionResetError as e:
-                print(e)
-                print(f"Connection to Twitch failed. Retrying in {2**exp} second(s)...")
-                time.sleep(2**exp)
-                exp += 1
-
-        await self.connect()
+
+    # keep the hash ring in line with the workers that are sending heartbeats
+    async def track_workers(self) -> None:
         while True:
-            data = await self.reader.read(1024)
-            try:
-                messages = data.decode()
-            except UnicodeDecodeError:
-                raise(UnicodeDecodeError(data))
+            if await self.router.poll(WORKER_HEARTBEAT * 1000):
+                identity, _ = await self.router.recv_multipart()
+                if identity not in self.workers:
+                    print(f"Worker {identity} joined")
+                    self.ring.add(identity)
+                self.workers[identity] = time.monotonic()
 
-            if len(messages) == 0:
-                continue
+            now = time.monotonic()
+            for identity, seen in list(self.workers.items()):
+                if now - seen > WORKER_TIMEOUT:
+                    print(f"Worker {identity} timed out")
+                    self.remove_worker(identity)
+
+
+    async def send_chat_message(self, channel:str, message:str) -> bool:
+        return await self.pool.send(channel, f"PRIVMSG #{channel} :{message}")
 
-            if messages.startswith("PING"):
-                await self.pong()
 
-            # ignore initial connection messages
-            elif messages.startswith(":tmi.twitch.tv"):
-                pass
+    async def handle_line(self, line:str, connection:ircpool.IrcConnection) -> None:
+        received = tracing.now()
+        if len(line) == 0:
+            return
+        LINES_READ.inc()
 
-            else:
-                payload = self.format_output(messages)
-                await self.publish_to_zmq(payload)
+        if line.startswith("PING"):
+            PINGS.inc()
+            await connection.send("PONG tmi.twitch.tv")
+
+        # ignore initial connection messages
+        elif line.startswith(":tmi.twitch.tv"):
+            pass
+
+        else:
+            channel = channel_of(line)
+            payload = self.format_output(line, channel)
+
+            # the trace follows this message through every hop until its reply is sent
+            payload["trace"] = tracing.start(payload["id"])
+            tracing.add_span(payload["trace"], "twitch_bot.read", received)
+            await self.publish_to_zmq(payload, user_id_of(line))
+            LINES_PUBLISHED.inc()
+            CHANNEL_LINES.labels(channel).inc()
+
+
+    # greetings wait their turn in the outbound queue like any other reply
+    def greet(self, channel:str) -> None:
+        self.outbound.put((channel, GREETING), ratelimit.PRIORITY_OTHER, ({}, tracing.now()))
+
+
+    async def join_channels(self) -> None:
+        for channel in self.channels:
+            await self.pool.join(channel)
+
+
+    # join, part and list channels while running; requests are {"action": ..., "channel": ...}
+    async def control(self) -> None:
+        socket = transport.socket(self.context, zmq.REP)
+        socket.bind(self.control_address)
+
+        while True:
+            frame = await socket.recv()
+
+            # a REP socket must answer every request before it can take the next one
+            try:
+                request = envelope.decode(frame)
+                action = request.get("action")
+                channel = request.get("channel", "")
+
+                if action == "join":
+                    ok = await self.pool.join(channel)
+                elif action == "part":
+                    ok = await self.pool.part(channel)
+                else:
+                    ok = action == "list"
+                response = {"status": "success" if ok else "failure", "channels": self.pool.channels()}
+
+            except Exception as e:
+                print(f"Control request failed: {e}")
+                response = {"status": "error", "error": str(e), "channels": self.pool.channels()}
+            await socket.send(json.dumps(response).encode())
 
 
     # read output messages from zmq
     async def get_outgoing_messages(self) -> None:
-        # sleep to allow self.read_chat() to create self.writer first
-        await asyncio.sleep(1)
-
         # sub socket to receive chat output messages from zmq
-        self.sub_socket = self.context.socket(zmq.SUB)
-        self.sub_socket.connect(self.sub_address)
-        self.sub_socket.setsockopt(zmq.SUBSCRIBE, bytes(self.outgoing_topic, "ascii"))
+        self.sub_socket = transport.subscriber(self.context, self.sub_address, self.outgoing_topic)
+        gaps = transport.GapDetector("chat_output_handler")
 
         while True:
             _, msg = await self.sub_socket.recv_multipart()
-            payload = json.loads(msg)
+            received = tracing.now()
+            payload = envelope.decode(msg)
+            gaps.check(payload)
             output_message = payload["data"]["message"]
+
+            # replies go back to the channel the command came from
+            channel = payload["data"].get("channel") or self.channels[0]
             
             # ignore blank output messages for incorrect commands
             if output_message:
-                await self.send_chat_message(output_message)
+                priority = payload["data"].get("priority")
+                if priority is None:
+                    priority = ratelimit.PRIORITY_OTHER
+
+                # the same reply in two channels is not a duplicate
+                result = self.outbound.put((channel, output_message), priority, (payload, received))
+                if result == ratelimit.DUPLICATE:
+                    REPLIES_DEDUPLICATED.inc()
+                elif result == ratelimit.FULL:
+                    REPLIES_DROPPED.inc()
+
+
+    # send queued replies as fast as twitch's rate limit allows
+    async def send_outgoing_messages(self) -> None:
+        while True:
+            (channel, output_message), (payload, received) = await self.outbound.get()
+            if not await self.send_chat_message(channel, output_message):
+                REPLIES_UNROUTED.inc()
+                continue
+            REPLIES_SENT.inc()
+            CHANNEL_REPLIES.labels(channel).inc()
+
+            trace = payload.get("trace")
+            if trace:
+                tracing.add_span(trace, "twitch_bot.send", received)
+                self.collector.record(trace, tracing.now())
 
 
     def run(self) -> None:
         self.context = Context()
+        self.collector = TraceCollector()
+
+        window = ratelimit.SlidingWindow(RATE_LIMIT, RATE_PERIOD)
+        self.outbound = ratelimit.OutboundQueue(window, DEDUP_WINDOW, MAX_QUEUED_REPLIES)
+        metrics.gauge("twitch_outbound_queue_depth", "Replies waiting for a rate limit token",
+                      function=lambda: len(self.outbound))
+
+        # irc connections for every joined channel, sharing twitch's JOIN limit
+        join_window = ratelimit.SlidingWindow(JOIN_LIMIT, JOIN_PERIOD)
+        self.pool = ircpool.IrcPool(self.server, self.port, self.oauth_token, self.bot_name,
+                                    self.handle_line, IRC_CONNECTIONS, CHANNELS_PER_CONNECTION,
+                                    join_window, self.greet)
+        metrics.gauge("twitch_channels_joined", "Channels the bot is in",
+                      function=lambda: len(self.pool.owners))
+
+        # pub socket to publish incoming messages to zmq, or a router to shard them
+        workers = []
+        if SHARDED:
+            self.router = transport.socket(self.context, zmq.ROUTER)
+            self.router.setsockopt(zmq.ROUTER_MANDATORY, 1)
 
-        # pub socket to publish incoming messages to zmq
-        self.pub = self.context.socket(zmq.PUB)
-        self.pub.bind(self.pub_address)
+            # a restarted worker reconnects under the same identity; let it take over the route
+            self.router.setsockopt(zmq.ROUTER_HANDOVER, 1)
+            self.router.bind(self.pub_address)
+            self.ring = HashRing()
+            self.workers = {}
+            self.shard_sequencers = {}
+            workers.append(self.track_workers())
+        else:
+            self.pub = transport.publisher(self.context, self.pub_address)
+            self.sequencer = transport.Sequencer()
 
-        cors = asyncio.wait([self.read_chat(), self.get_outgoing_messages()])
+        cors = asyncio.wait(workers + self.pool.readers() + [
+            self.join_channels(),
+            self.control(),
+            self.get_outgoing_messages(),
+            self.send_outgoing_messages(),
+            self.collector.run(),
+            metrics.serve()
+        ])
         asyncio.get_event_loop().run_until_complete(cors)
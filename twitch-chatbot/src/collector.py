@@ -0,0 +1,73 @@
+import asyncio
+import json
+import os
+from bisect import bisect_left
+
+# aggregated trace histograms are rewritten to this file
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.json")
+FLUSH_INTERVAL = 60
+
+# histogram bucket upper bounds in milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, ms:float) -> None:
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+
+    def as_dict(self) -> dict:
+        bounds = [str(b) for b in BUCKETS_MS] + ["inf"]
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count if self.count else 0.0,
+            "buckets_ms": dict(zip(bounds, self.counts))
+        }
+
+
+# closes traces when a reply goes out and aggregates their latencies
+class TraceCollector:
+    def __init__(self, path:str=TRACE_FILE):
+        self.path = path
+        self.replies = {}
+        self.hops = {}
+
+    def histogram(self, histograms:dict, name:str) -> Histogram:
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = Histogram()
+        return histogram
+
+    def record(self, trace:dict, end:int) -> None:
+        spans = trace.get("spans")
+        if not spans:
+            return
+
+        # chat-to-reply latency runs from the first hop's start to the reply being sent
+        command = trace.get("command") or "none"
+        self.histogram(self.replies, command).observe((end - spans[0][1]) / 1e6)
+        for hop, start, stop in spans:
+            self.histogram(self.hops, hop).observe((stop - start) / 1e6)
+
+    def write(self) -> None:
+        output = {
+            "chat_to_reply": {k: h.as_dict() for k, h in self.replies.items()},
+            "hops": {k: h.as_dict() for k, h in self.hops.items()}
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(output, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                self.write()
+            except OSError as e:
+                print(e)
@@ -0,0 +1,45 @@
+import bisect
+import hashlib
+
+# consistent hash ring; adding or removing a node only moves that node's share of keys
+class HashRing:
+    def __init__(self, replicas:int=100):
+        self.replicas = replicas
+        self.hashes = []
+        self.nodes = {}
+
+    @staticmethod
+    def hash(key:bytes) -> int:
+        # python's hash() is salted per process, so use a stable digest
+        return int.from_bytes(hashlib.md5(key).digest()[:8], "big")
+
+    def __len__(self) -> int:
+        return len(self.hashes) // self.replicas
+
+    def __contains__(self, node:bytes) -> bool:
+        return self.hash(node + b"#0") in self.nodes
+
+    def add(self, node:bytes) -> None:
+        for i in range(self.replicas):
+            h = self.hash(node + b"#%d" % i)
+            if h not in self.nodes:
+                bisect.insort(self.hashes, h)
+            self.nodes[h] = node
+
+    def remove(self, node:bytes) -> None:
+        for i in range(self.replicas):
+            h = self.hash(node + b"#%d" % i)
+            if self.nodes.get(h) == node:
+                del self.nodes[h]
+                self.hashes.pop(bisect.bisect_left(self.hashes, h))
+
+    # the node owning key, or the next one round the ring that isn't in skip
+    def get(self, key:bytes, skip=()) -> bytes:
+        if not self.hashes:
+            return None
+        start = bisect.bisect(self.hashes, self.hash(key))
+        for i in range(start, start + len(self.hashes)):
+            node = self.nodes[self.hashes[i % len(self.hashes)]]
+            if node not in skip:
+                return node
+        return None
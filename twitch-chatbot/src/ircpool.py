@@ -0,0 +1,227 @@
+import asyncio
+import metrics
+import ratelimit
+
+# longest IRC line kept, tags included; twitch's own lines stay well under it
+READ_LIMIT = 2**16
+
+LINES_DROPPED = metrics.counter("twitch_lines_dropped_total", "IRC lines over the read buffer limit")
+RECONNECTS = metrics.counter("twitch_reconnects_total", "Reconnects after Twitch closed the connection")
+JOINS = metrics.counter("twitch_joins_total", "Channel JOINs sent, including rejoins after a reconnect")
+
+# "#Channel" -> "channel"
+def normalize(channel:str) -> str:
+    return channel.strip().lstrip("#").lower()
+
+
+# twitch's welcome numeric, sent once PASS and NICK are accepted
+def is_welcome(line:str) -> bool:
+    return line.split(" ", 2)[1:2] == ["001"]
+
+
+class IrcConnection:
+    def __init__(self, pool, index:int):
+        self.pool = pool
+        self.index = index
+        self.channels = set()
+        self.reader = None
+        self.writer = None
+        self.connected = asyncio.Event()
+
+
+    async def send(self, message:str) -> None:
+        await self.connected.wait()
+        self.writer.write(f"{message}\r\n".encode())
+        await self.writer.drain()
+
+
+    async def open(self) -> None:
+        self.connected.clear()
+
+        # don't leak the socket of a connection twitch has closed
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        exp = 0
+        connected = False
+        while not connected:
+            try:
+                self.reader, self.writer = await asyncio.open_connection(
+                        self.pool.server, self.pool.port, limit=READ_LIMIT)
+                connected = True
+                print(f"Connection {self.index} to Twitch IRC open")
+
+            # retry connection at increasing intervals
+            except (ConnectionError, OSError) as e:
+                print(e)
+                print(f"Connection to Twitch failed. Retrying in {2**exp} second(s)...")
+                await asyncio.sleep(2**exp)
+                exp += 1
+
+        self.writer.write(f"PASS oauth:{self.pool.oauth_token}\r\n".encode())
+        self.writer.write(f"NICK {self.pool.bot_name}\r\n".encode())
+        self.writer.write(b"CAP REQ :twitch.tv/tags\r\n")
+        await self.writer.drain()
+
+        # a new connection has joined nothing, so rejoin this connection's channels;
+        # the joins wait for read() to see twitch accept the login
+        for channel in list(self.channels):
+            asyncio.create_task(self.join(channel))
+
+
+    # False if the pool gave the channel up, by parting it, while this waited its turn
+    async def join(self, channel:str) -> bool:
+        await self.connected.wait()
+        await self.pool.join_slot()
+        if not self.pool.wants(channel, self):
+            return False
+        self.channels.add(channel)
+        await self.send(f"JOIN #{channel}")
+        JOINS.inc()
+        return True
+
+
+    async def part(self, channel:str) -> None:
+        self.channels.discard(channel)
+        await self.send(f"PART #{channel}")
+
+
+    async def read(self) -> None:
+        await self.open()
+
+        # set while the rest of an oversized line is still being thrown away
+        skipping = False
+        while True:
+            # IRC messages are CRLF terminated; one read may hold several or part of one
+            try:
+                data = await self.reader.readuntil(b"\r\n")
+
+            except asyncio.IncompleteReadError:
+                print(f"Connection {self.index} to Twitch closed. Reconnecting...")
+                RECONNECTS.inc()
+                skipping = False
+                await self.open()
+                continue
+
+            # drop a line longer than the reader's buffer limit, up to and including its CRLF
+            except asyncio.LimitOverrunError as e:
+                if not skipping:
+                    LINES_DROPPED.inc()
+                    skipping = True
+                await self.reader.readexactly(e.consumed)
+                continue
+
+            # the tail end of a dropped line
+            if skipping:
+                skipping = False
+                continue
+
+            line = data[:-2].decode(errors="replace")
+            if not self.connected.is_set() and is_welcome(line):
+                print(f"Connection {self.index} logged in")
+                self.connected.set()
+            await self.pool.on_line(line, self)
+
+
+# a few IRC connections sharing the bot's channels; twitch caps JOINs per account
+class IrcPool:
+    def __init__(self, server:str, port:int, oauth_token:str, bot_name:str, on_line,
+                 size:int, channels_per_connection:int, join_window:ratelimit.SlidingWindow,
+                 on_join=None):
+        self.server = server
+        self.port = port
+        self.oauth_token = oauth_token
+        self.bot_name = bot_name
+        self.on_line = on_line
+        self.channels_per_connection = channels_per_connection
+        self.join_window = join_window
+
+        # called with each newly joined channel, but not on rejoins after a reconnect
+        self.on_join = on_join
+
+        self.connections = [IrcConnection(self, i) for i in range(size)]
+
+        # channel -> the connection that joined it, or that is waiting to join it
+        self.owners = {}
+        self.pending = {}
+
+
+    def channels(self) -> list:
+        return sorted(self.owners)
+
+
+    async def join_slot(self) -> None:
+        while True:
+            wait = self.join_window.take()
+            if wait == 0:
+                return
+            await asyncio.sleep(wait)
+
+
+    def wants(self, channel:str, connection:IrcConnection) -> bool:
+        return self.owners.get(channel) is connection or self.pending.get(channel) is connection
+
+
+    # joins on the least loaded connection; False if every connection is full or the
+    # channel was parted before its turn to join came
+    async def join(self, channel:str) -> bool:
+        channel = normalize(channel)
+        if not channel:
+            return False
+        if channel in self.owners or channel in self.pending:
+            return True
+
+        # count pending joins too so queued joins are spread out
+        loads = {c: 0 for c in self.connections}
+        for owner in list(self.owners.values()) + list(self.pending.values()):
+            loads[owner] += 1
+        connection = min(self.connections, key=loads.get)
+        if loads[connection] >= self.channels_per_connection:
+            print(f"No connection has room to join {channel}")
+            return False
+
+        self.pending[channel] = connection
+        try:
+            if not await connection.join(channel):
+                return False
+        except (ConnectionError, OSError) as e:
+            print(f"Joining {channel} failed: {e}")
+            connection.channels.discard(channel)
+            if self.pending.get(channel) is connection:
+                del self.pending[channel]
+            return False
+
+        # parted after the JOIN went out, so leave again
+        if self.pending.pop(channel, None) is not connection:
+            await connection.part(channel)
+            return False
+        self.owners[channel] = connection
+        if self.on_join:
+            self.on_join(channel)
+        return True
+
+
+    async def part(self, channel:str) -> bool:
+        channel = normalize(channel)
+
+        # a pending join sees the channel is gone and gives up
+        if self.pending.pop(channel, None) is not None:
+            return True
+        connection = self.owners.pop(channel, None)
+        if connection is None:
+            return False
+        await connection.part(channel)
+        return True
+
+
+    # send a line on the connection that joined the channel
+    async def send(self, channel:str, message:str) -> bool:
+        connection = self.owners.get(channel)
+        if connection is None:
+            return False
+        await connection.send(message)
+        return True
+
+
+    def readers(self) -> list:
+        return [c.read() for c in self.connections]
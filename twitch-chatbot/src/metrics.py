@@ -0,0 +1,148 @@
+import asyncio
+import os
+from bisect import bisect_left
+
+# port for the metrics listener on services without an http server
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 9100))
+
+# histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount:float=1) -> None:
+        self.value += amount
+
+    def samples(self, name:str, labels:str) -> list:
+        return [f"{name}{labels} {self.value}"]
+
+
+class Gauge:
+    __slots__ = ("value", "function")
+
+    # gauges may instead sample a function at scrape time
+    def __init__(self, function=None):
+        self.value = 0
+        self.function = function
+
+    def set(self, value:float) -> None:
+        self.value = value
+
+    def inc(self, amount:float=1) -> None:
+        self.value += amount
+
+    def dec(self, amount:float=1) -> None:
+        self.value -= amount
+
+    def samples(self, name:str, labels:str) -> list:
+        value = self.function() if self.function else self.value
+        return [f"{name}{labels} {value}"]
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets:tuple=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value:float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self, name:str, labels:str) -> list:
+        # le is appended to any existing labels
+        prefix = labels[:-1] + "," if labels else "{"
+        lines = []
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            lines.append(f'{name}_bucket{prefix}le="{bound}"}} {total}')
+        total += self.counts[-1]
+        lines.append(f'{name}_bucket{prefix}le="+Inf"}} {total}')
+        lines.append(f"{name}_sum{labels} {self.sum}")
+        lines.append(f"{name}_count{labels} {total}")
+        return lines
+
+
+class Family:
+    def __init__(self, kind:str, name:str, help:str, labelnames:tuple, factory):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.factory = factory
+        self.children = {}
+
+    # children are cached, so hot paths should bind them once and reuse them
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self.factory()
+        return child
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self.children.items():
+            pairs = ",".join(f'{k}="{v}"' for k, v in zip(self.labelnames, values))
+            labels = f"{{{pairs}}}" if pairs else ""
+            lines.extend(child.samples(self.name, labels))
+        return lines
+
+
+REGISTRY = []
+
+# unlabelled metrics return the metric itself, labelled ones return the family
+def register(kind:str, name:str, help:str, labels:tuple, factory):
+    family = Family(kind, name, help, tuple(labels), factory)
+    REGISTRY.append(family)
+    return family.labels() if not labels else family
+
+
+def counter(name:str, help:str, labels:tuple=()):
+    return register("counter", name, help, labels, Counter)
+
+
+def gauge(name:str, help:str, labels:tuple=(), function=None):
+    return register("gauge", name, help, labels, lambda: Gauge(function))
+
+
+def histogram(name:str, help:str, labels:tuple=(), buckets:tuple=DEFAULT_BUCKETS):
+    return register("histogram", name, help, labels, lambda: Histogram(buckets))
+
+
+def render() -> str:
+    lines = []
+    for family in REGISTRY:
+        lines.extend(family.render())
+    return "\n".join(lines) + "\n"
+
+
+# minimal http listener that answers every request with the current metrics
+async def handle_scrape(reader:asyncio.StreamReader, writer:asyncio.StreamWriter) -> None:
+    try:
+        while (await reader.readline()).strip():
+            pass
+        body = render().encode()
+        writer.write(
+            b"HTTP/1.0 200 OK\r\n"
+            + f"Content-Type: {CONTENT_TYPE}\r\n".encode()
+            + f"Content-Length: {len(body)}\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve(port:int=METRICS_PORT) -> None:
+    server = await asyncio.start_server(handle_scrape, "0.0.0.0", port)
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,93 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict, deque
+
+# reply priorities; lower is sent first
+PRIORITY_MOD = 0
+PRIORITY_COMMAND = 1
+PRIORITY_OTHER = 2
+
+# results of OutboundQueue.put
+QUEUED = "queued"
+DUPLICATE = "duplicate"
+FULL = "full"
+
+# at most limit sends in any period seconds, the way twitch counts them; unlike a
+# bucket that starts full, it never allows a burst on top of a full window
+class SlidingWindow:
+    def __init__(self, limit:int, period:float, clock=time.monotonic):
+        self.limit = limit
+        self.period = period
+        self.clock = clock
+
+        # times of the sends still inside the window, oldest first
+        self.sent = deque()
+
+    def __len__(self) -> int:
+        return len(self.sent)
+
+    # record a send if the window has room; otherwise return seconds until it does
+    def take(self) -> float:
+        now = self.clock()
+        while self.sent and now - self.sent[0] >= self.period:
+            self.sent.popleft()
+        if len(self.sent) < self.limit:
+            self.sent.append(now)
+            return 0.0
+        return self.sent[0] + self.period - now
+
+
+# priority queue of outgoing replies, paced by a sliding window
+class OutboundQueue:
+    def __init__(self, window:SlidingWindow, dedup_window:float, max_size:int,
+                 clock=time.monotonic, sleep=asyncio.sleep):
+        self.window = window
+        self.dedup_window = dedup_window
+        self.max_size = max_size
+        self.clock = clock
+        self.sleep = sleep
+
+        self.heap = []
+        self.order = itertools.count()
+        self.recent = OrderedDict()
+        self.ready = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def is_duplicate(self, message:str, now:float) -> bool:
+        # forget replies older than the window; recent is ordered oldest first
+        while self.recent:
+            oldest, queued = next(iter(self.recent.items()))
+            if now - queued < self.dedup_window:
+                break
+            self.recent.popitem(last=False)
+        return message in self.recent
+
+    def put(self, message:str, priority:int=PRIORITY_OTHER, item=None) -> str:
+        now = self.clock()
+        if self.is_duplicate(message, now):
+            return DUPLICATE
+        if len(self.heap) >= self.max_size:
+            return FULL
+
+        self.recent[message] = now
+        heapq.heappush(self.heap, (priority, next(self.order), message, item))
+        self.ready.set()
+        return QUEUED
+
+    # wait for the highest priority reply and room in the window to send it
+    async def get(self) -> tuple:
+        while True:
+            if not self.heap:
+                self.ready.clear()
+                await self.ready.wait()
+                continue
+
+            wait = self.window.take()
+            if wait == 0:
+                _, _, message, item = heapq.heappop(self.heap)
+                return message, item
+            await self.sleep(wait)
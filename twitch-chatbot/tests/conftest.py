@@ -0,0 +1,5 @@
+import os
+import sys
+
+# services import their modules flat from src/, as they do in the container
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
@@ -0,0 +1,30 @@
+from hashring import HashRing
+
+
+def ring(*nodes) -> HashRing:
+    r = HashRing()
+    for node in nodes:
+        r.add(node)
+    return r
+
+
+def test_keys_spread_and_stay_put():
+    r = ring(b"a", b"b", b"c")
+    owners = {key: r.get(key) for key in (b"user%d" % i for i in range(300))}
+    assert set(owners.values()) == {b"a", b"b", b"c"}
+
+    # removing a node only moves the keys it owned
+    r.remove(b"c")
+    for key, owner in owners.items():
+        if owner != b"c":
+            assert r.get(key) == owner
+
+
+def test_skip_picks_next_node_and_none_when_all_skipped():
+    r = ring(b"a", b"b", b"c")
+    owner = r.get(b"user1")
+    other = r.get(b"user1", {owner})
+    assert other not in (owner, None)
+    assert r.get(b"user1", {owner, other}) not in (owner, other, None)
+    assert r.get(b"user1", {b"a", b"b", b"c"}) is None
+    assert HashRing().get(b"user1") is None
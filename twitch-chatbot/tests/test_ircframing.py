@@ -0,0 +1,108 @@
+import asyncio
+import random
+
+import ircpool
+import ratelimit
+
+WELCOME = ":tmi.twitch.tv 001 bot :Welcome, GLHF!"
+
+
+def privmsg(n:int) -> str:
+    return (f"@badges=;color=#1E90FF;display-name=Viewer{n};user-id={100000 + n} "
+            f":viewer{n}!viewer{n}@viewer{n}.tmi.twitch.tv PRIVMSG #channel :message {n}")
+
+
+# serves the given chunks of raw bytes to the bot, each as its own write, and
+# returns the lines the connection framed out of them
+def read_lines(chunks:list, expected:int, timeout:float=10) -> list:
+    async def run():
+        async def serve(reader, writer):
+            for chunk in chunks:
+                writer.write(chunk)
+                await writer.drain()
+
+                # give the reader a chance to see each write on its own
+                await asyncio.sleep(0)
+            await reader.read()
+
+        server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        lines = []
+        done = asyncio.Event()
+
+        async def on_line(line, connection):
+            lines.append(line)
+            if len(lines) >= expected:
+                done.set()
+
+        pool = ircpool.IrcPool("127.0.0.1", port, "token", "bot", on_line, 1, 50,
+                               ratelimit.SlidingWindow(20, 10))
+        reader = asyncio.ensure_future(pool.connections[0].read())
+        try:
+            await asyncio.wait_for(done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+        pool.connections[0].writer.close()
+        server.close()
+        return lines
+    return asyncio.run(run())
+
+
+def crlf(*lines) -> bytes:
+    return "".join(f"{l}\r\n" for l in lines).encode()
+
+
+def test_several_lines_in_one_write():
+    lines = [WELCOME, privmsg(1), privmsg(2), privmsg(3)]
+    assert read_lines([crlf(*lines)], 4) == lines
+
+
+def test_line_split_across_writes():
+    data = crlf(WELCOME, privmsg(1))
+    chunks = [data[:10], data[10:len(WELCOME) + 1], data[len(WELCOME) + 1:-1], data[-1:]]
+    assert read_lines(chunks, 2) == [WELCOME, privmsg(1)]
+
+
+def test_crlf_split_between_writes():
+    data = crlf(privmsg(1), privmsg(2))
+    cut = data.index(b"\r\n") + 1
+    assert read_lines([data[:cut], data[cut:]], 2) == [privmsg(1), privmsg(2)]
+
+
+def test_ping_and_chat_in_one_chunk():
+    lines = ["PING :tmi.twitch.tv", privmsg(1), "PING :tmi.twitch.tv", privmsg(2)]
+    assert read_lines([crlf(*lines)], 4) == lines
+
+
+def test_oversized_line_dropped_through_its_crlf(monkeypatch):
+    monkeypatch.setattr(ircpool, "READ_LIMIT", 256)
+    dropped = ircpool.LINES_DROPPED.value
+    huge = "@" + "x" * 2000 + " :viewer PRIVMSG #channel :spam"
+
+    # the oversized line arrives in several writes, and the next line shares its last one
+    data = crlf(privmsg(1), huge, privmsg(2))
+    start = len(crlf(privmsg(1)))
+    end = start + len(huge) + 2
+    chunks = [data[:start + 100], data[start + 100:start + 700], data[start + 700:end - 1],
+              data[end - 1:]]
+    assert read_lines(chunks, 2) == [privmsg(1), privmsg(2)]
+    assert ircpool.LINES_DROPPED.value == dropped + 1
+
+
+# a long run of chat cut into random sized chunks, as tcp may deliver it
+def test_replay_100k_lines_without_loss():
+    count = 100000
+    data = crlf(*(privmsg(n) for n in range(count)))
+    rng = random.Random(4)
+    chunks = []
+    pos = 0
+    while pos < len(data):
+        size = rng.randint(1, 8192)
+        chunks.append(data[pos:pos + size])
+        pos += size
+
+    lines = read_lines(chunks, count, timeout=60)
+    assert len(lines) == count
+    assert lines == [privmsg(n) for n in range(count)]
@@ -0,0 +1,117 @@
+import asyncio
+
+import ircpool
+import ratelimit
+
+
+# a tiny twitch: welcomes a client after NICK unless told to hold off, and records lines
+class FakeTwitch:
+    def __init__(self):
+        self.lines = []
+        self.clients = []
+        self.welcome = asyncio.Event()
+        self.welcome.set()
+
+    async def handle(self, reader, writer):
+        self.clients.append(writer)
+        while True:
+            data = await reader.readline()
+            if not data:
+                return
+            line = data.decode().rstrip("\r\n")
+            self.lines.append(line)
+            if line.startswith("NICK"):
+                await self.welcome.wait()
+                writer.write(b":tmi.twitch.tv 001 bot :Welcome, GLHF!\r\n")
+                await writer.drain()
+
+    def sent(self, verb:str) -> list:
+        return [l for l in self.lines if l.startswith(verb)]
+
+
+async def settle():
+    for _ in range(20):
+        await asyncio.sleep(0.01)
+
+
+def run_with_pool(test, join_limit:int=20, join_period:float=10, size:int=1):
+    async def run():
+        twitch = FakeTwitch()
+        server = await asyncio.start_server(twitch.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+
+        async def on_line(line, connection):
+            pass
+        joined = []
+        window = ratelimit.SlidingWindow(join_limit, join_period)
+        pool = ircpool.IrcPool("127.0.0.1", port, "token", "bot", on_line, size, 50, window,
+                               joined.append)
+        readers = [asyncio.ensure_future(r) for r in pool.readers()]
+        try:
+            await test(twitch, pool, joined)
+        finally:
+            for r in readers:
+                r.cancel()
+            await asyncio.gather(*readers, return_exceptions=True)
+            for writer in twitch.clients:
+                writer.close()
+            server.close()
+    asyncio.run(run())
+
+
+def test_connected_only_after_welcome():
+    async def test(twitch, pool, joined):
+        twitch.welcome.clear()
+        join = asyncio.ensure_future(pool.join("#Channel"))
+        await settle()
+        assert not pool.connections[0].connected.is_set()
+        assert twitch.sent("JOIN") == []
+        assert pool.channels() == []
+
+        twitch.welcome.set()
+        assert await join
+        await settle()
+        assert twitch.sent("JOIN") == ["JOIN #channel"]
+        assert pool.channels() == ["channel"]
+        assert joined == ["channel"]
+    run_with_pool(test)
+
+
+def test_part_cancels_a_pending_join():
+    async def test(twitch, pool, joined):
+        assert await pool.join("first")
+
+        # the join window is full, so the second join waits its turn
+        join = asyncio.ensure_future(pool.join("second"))
+        await settle()
+        assert await pool.part("second")
+        assert not await join
+        await settle()
+        assert twitch.sent("JOIN") == ["JOIN #first"]
+        assert pool.channels() == ["first"]
+        assert joined == ["first"]
+        assert not await pool.part("second")
+    run_with_pool(test, join_limit=1, join_period=0.5)
+
+
+def test_rejoin_after_reconnect_does_not_greet():
+    async def test(twitch, pool, joined):
+        assert await pool.join("channel")
+        await settle()
+        twitch.clients[0].close()
+        for _ in range(50):
+            await asyncio.sleep(0.02)
+            if len(twitch.sent("JOIN")) == 2:
+                break
+        assert twitch.sent("JOIN") == ["JOIN #channel", "JOIN #channel"]
+        assert joined == ["channel"]
+    run_with_pool(test)
+
+
+def test_joins_spread_over_connections():
+    async def test(twitch, pool, joined):
+        for channel in ("a", "b", "c", "d"):
+            assert await pool.join(channel)
+        owners = [pool.owners[c].index for c in ("a", "b", "c", "d")]
+        assert sorted(owners) == [0, 0, 1, 1]
+    run_with_pool(test, size=2)
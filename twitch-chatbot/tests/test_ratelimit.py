@@ -0,0 +1,115 @@
+import asyncio
+
+import ratelimit
+from ratelimit import OutboundQueue, SlidingWindow
+
+
+# simulated time: sleeping moves the clock forward instead of waiting
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds:float) -> None:
+        self.now += seconds
+
+
+def queue(clock:FakeClock, limit:int=20, period:float=30, dedup_window:float=5,
+          max_size:int=100) -> OutboundQueue:
+    window = SlidingWindow(limit, period, clock)
+    return OutboundQueue(window, dedup_window, max_size, clock, clock.sleep)
+
+
+def drain(outbound:OutboundQueue, clock:FakeClock, count:int) -> list:
+    async def get_all():
+        sent = []
+        for _ in range(count):
+            message, _ = await outbound.get()
+            sent.append((clock.now, message))
+        return sent
+    return asyncio.run(get_all())
+
+
+def test_window_allows_limit_then_waits():
+    clock = FakeClock()
+    window = SlidingWindow(3, 10, clock)
+    assert [window.take() for _ in range(3)] == [0, 0, 0]
+    assert window.take() == 10
+
+    clock.now += 4
+    assert window.take() == 6
+    clock.now += 6
+    assert window.take() == 0
+    assert len(window) == 1
+
+
+def test_window_never_bursts_past_limit():
+    # a full bucket plus its refill let 39 sends through in 30 seconds
+    clock = FakeClock()
+    outbound = queue(clock)
+    for i in range(60):
+        outbound.put(f"reply {i}")
+    sent = [t for t, _ in drain(outbound, clock, 60)]
+    for i, start in enumerate(sent):
+        in_window = [t for t in sent[i:] if t - start < 30]
+        assert len(in_window) <= 20
+
+
+def test_pacing_spreads_sends_by_period():
+    clock = FakeClock()
+    outbound = queue(clock, limit=2, period=10)
+    for i in range(5):
+        outbound.put(f"reply {i}")
+    times = [t - 1000 for t, _ in drain(outbound, clock, 5)]
+    assert times == [0, 0, 10, 10, 20]
+
+
+def test_priority_order_then_fifo():
+    clock = FakeClock()
+    outbound = queue(clock)
+    outbound.put("chat 1", ratelimit.PRIORITY_OTHER)
+    outbound.put("command 1", ratelimit.PRIORITY_COMMAND)
+    outbound.put("mod 1", ratelimit.PRIORITY_MOD)
+    outbound.put("command 2", ratelimit.PRIORITY_COMMAND)
+    outbound.put("chat 2", ratelimit.PRIORITY_OTHER)
+    sent = [m for _, m in drain(outbound, clock, 5)]
+    assert sent == ["mod 1", "command 1", "command 2", "chat 1", "chat 2"]
+
+
+def test_priority_applies_to_replies_queued_while_waiting():
+    clock = FakeClock()
+    outbound = queue(clock, limit=1, period=10)
+    outbound.put("chat 1")
+    outbound.put("chat 2")
+
+    async def run():
+        first, _ = await outbound.get()
+        outbound.put("mod 1", ratelimit.PRIORITY_MOD)
+        second, _ = await outbound.get()
+        return first, second
+    assert asyncio.run(run()) == ("chat 1", "mod 1")
+
+
+def test_duplicates_dropped_inside_dedup_window():
+    clock = FakeClock()
+    outbound = queue(clock, dedup_window=5)
+    assert outbound.put("same") == ratelimit.QUEUED
+    clock.now += 4
+    assert outbound.put("same") == ratelimit.DUPLICATE
+    clock.now += 1
+    assert outbound.put("same") == ratelimit.QUEUED
+    assert len(outbound) == 2
+
+
+def test_full_queue_refuses_replies():
+    clock = FakeClock()
+    outbound = queue(clock, max_size=2)
+    assert outbound.put("a") == ratelimit.QUEUED
+    assert outbound.put("b") == ratelimit.QUEUED
+    assert outbound.put("c") == ratelimit.FULL
+
+    # a refused reply isn't remembered as sent
+    drain(outbound, clock, 1)
+    assert outbound.put("c") == ratelimit.QUEUED